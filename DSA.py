@@ -1,5 +1,27 @@
+import copy
+import csv
 import datetime
+import json
+import math
+import mmap
+import os
+import pickle
 import random
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; it speeds up EdgeMetrics and backs NetworkSnapshot.to_numpy
+    np = None
 
 
 class MinHeap:
@@ -61,430 +83,3436 @@ class MinHeap:
         return len(self.heap) == 0
 
 
-class City:
-    """Represents a city in the transportation network."""
-    
-    def __init__(self, name):
-        self.name = name
-        self.connections = []  # List of (destination, comfort, cost, duration)
-        self.next_city = None
-    
-    def add_connection(self, destination, comfort, cost, duration):
-        # Check if connection already exists
-        for dest, _, _, _ in self.connections:
-            if dest.lower() == destination.lower():
-                return False
-        self.connections.append((destination, comfort, cost, duration))
-        return True
+class IndexedMinHeap:
+    """
+    Iterative min heap that tracks the position of every item.
 
+    Entries are (priority, sequence, item_id) tuples, so equal priorities
+    pop in insertion order. The position index makes decrease_key and
+    membership tests O(log n) and O(1) without pushing duplicates.
+    The pushes and decreases counters feed the search statistics.
+    """
 
-class TransportSystem:
-    """Manages a linked list of cities and routes between them."""
-    
-    def __init__(self):
-        self.head = None
-        self.comfort_levels = {
-            'Economy': {'price_factor': 1.0, 'satisfaction': 'Basic comfort', 'comfort_score': 1},
-            'Standard': {'price_factor': 1.3, 'satisfaction': 'Comfortable journey', 'comfort_score': 2},
-            'Premium': {'price_factor': 2.0, 'satisfaction': 'Luxury experience', 'comfort_score': 4},
-            'Express': {'price_factor': 1.5, 'satisfaction': 'Fast service', 'comfort_score': 3}
-        }
-        
-    def add_city(self, name):
-        """Add a city to the transport system."""
-        # Check if city already exists
-        if self.get_city(name):
+    def __init__(self, items=None):
+        self.heap = []
+        self.position = {}  # item_id -> index in self.heap
+        self._counter = 0
+        self.decreases = 0
+        if items is not None:
+            self.heapify(items)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, item_id):
+        return item_id in self.position
+
+    def is_empty(self):
+        """Check if the heap is empty."""
+        return not self.heap
+
+    def heapify(self, items):
+        """Replace the contents with (item_id, priority) pairs in O(n)."""
+        self.heap = []
+        self.position = {}
+        for item_id, priority in items:
+            if item_id in self.position:
+                continue
+            self.position[item_id] = len(self.heap)
+            self.heap.append((priority, self._counter, item_id))
+            self._counter += 1
+        for index in range(len(self.heap) // 2 - 1, -1, -1):
+            self._sift_down(index)
+
+    def push(self, item_id, priority):
+        """Add an item; returns False if it is already queued."""
+        if item_id in self.position:
             return False
-            
-        city = City(name)
-        if not self.head:
-            self.head = city
-        else:
-            temp = self.head
-            while temp.next_city:
-                temp = temp.next_city
-            temp.next_city = city
+        self.heap.append((priority, self._counter, item_id))
+        self._counter += 1
+        self._sift_up(len(self.heap) - 1)
         return True
 
-    def add_route(self, start, end, comfort, cost, duration):
-        """Add a bidirectional route between two cities."""
-        origin = self.get_city(start)
-        destination = self.get_city(end)
-        
-        if not origin or not destination:
+    def decrease_key(self, item_id, new_priority):
+        """Lower the priority of a queued item; returns False if not lowered."""
+        index = self.position.get(item_id)
+        if index is None:
             return False
-            
-        # Add bidirectional connection
-        origin.add_connection(end, comfort, cost, duration)
-        destination.add_connection(start, comfort, cost, duration)
+        priority, sequence, _ = self.heap[index]
+        if new_priority >= priority:
+            return False
+        self.heap[index] = (new_priority, sequence, item_id)
+        self._sift_up(index)
+        self.decreases += 1
         return True
 
-    def get_city(self, name):
-        """Get a city by name."""
-        temp = self.head
-        while temp:
-            if temp.name.lower() == name.lower():
-                return temp
-            temp = temp.next_city
-        return None
+    @property
+    def pushes(self):
+        """Number of items ever queued (the next sequence number)."""
+        return self._counter
 
-    def show_cities(self):
-        """Display all cities in the system."""
-        if not self.head:
-            print("\nNo cities available for booking.")
+    def peek(self):
+        """Return (item_id, priority) of the smallest item without removing it."""
+        if not self.heap:
+            return None
+        priority, _, item_id = self.heap[0]
+        return item_id, priority
+
+    def pop(self):
+        """Remove and return (item_id, priority) of the smallest item."""
+        if not self.heap:
+            return None
+        heap = self.heap
+        last = heap.pop()
+        if heap:
+            priority, _, item_id = heap[0]
+            heap[0] = last
+            self.position[last[2]] = 0
+            self._sift_down(0)
+        else:
+            priority, _, item_id = last
+        del self.position[item_id]
+        return item_id, priority
+
+    def _sift_up(self, index):
+        """Move an entry up until its parent is not larger."""
+        heap = self.heap
+        position = self.position
+        entry = heap[index]
+        while index > 0:
+            parent = (index - 1) >> 1
+            parent_entry = heap[parent]
+            if entry < parent_entry:
+                heap[index] = parent_entry
+                position[parent_entry[2]] = index
+                index = parent
+            else:
+                break
+        heap[index] = entry
+        position[entry[2]] = index
+
+    def _sift_down(self, index):
+        """Move an entry down until both children are not smaller."""
+        # Walk the hole down to a leaf along the smaller children, then sift
+        # the entry back up (fewer comparisons than checking at every level).
+        heap = self.heap
+        position = self.position
+        size = len(heap)
+        start = index
+        entry = heap[index]
+        child = 2 * index + 1
+        while child < size:
+            right = child + 1
+            if right < size and not heap[child] < heap[right]:
+                child = right
+            moved = heap[child]
+            heap[index] = moved
+            position[moved[2]] = index
+            index = child
+            child = 2 * index + 1
+        while index > start:
+            parent = (index - 1) >> 1
+            parent_entry = heap[parent]
+            if entry < parent_entry:
+                heap[index] = parent_entry
+                position[parent_entry[2]] = index
+                index = parent
+            else:
+                break
+        heap[index] = entry
+        position[entry[2]] = index
+
+
+# Default for RouteCache lookups, distinct from a cached None (no route)
+_MISSING = object()
+
+
+class RouteCache:
+    """
+    Least-recently-used cache of route results with a size limit.
+
+    get counts a hit or a miss; peek and membership tests do not.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """Return the cached result and mark it as recently used."""
+        if key not in self.entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def peek(self, key, default=None):
+        """Return the cached result without counting a lookup or refreshing it."""
+        return self.entries.get(key, default)
+
+    def put(self, key, result):
+        """Store result, evicting the least recently used entry."""
+        if self.max_size <= 0:
             return
-            
-        temp = self.head
-        print("\nCities Available For Booking:")
-        while temp:
-            print(f"- {temp.name}")
-            temp = temp.next_city
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result."""
+        self.entries.clear()
+
+    def evict(self, predicate):
+        """Drop every entry for which predicate(key, result) is true; returns their keys."""
+        stale = [key for key, result in self.entries.items() if predicate(key, result)]
+        for key in stale:
+            del self.entries[key]
+        return stale
+
+
+class RouteResult(Mapping):
+    """
+    Immutable result of one route search.
+
+    Segment data is kept in typed arrays and the route reuses the city name
+    strings of the snapshot, so a result costs a few small allocations
+    instead of a dict of six lists. It reads like the result dicts it
+    replaces: result['costs'] and friends return tuples built on access,
+    and to_dict() gives a plain dict with lists. Results are shared by the
+    route cache and every caller, and replace() returns a changed copy.
+    """
 
-    def calculate_best_route(self, start, end, priority="time"):
+    __slots__ = ('route', 'total_duration', 'total_cost', 'avg_comfort', 'departure', 'arrival',
+                 'time_priority_cost', '_durations', '_costs', '_traffic', '_comforts', '_comfort_names')
+
+    _KEYS = ('total_duration', 'total_cost', 'route', 'traffic_applied', 'costs', 'durations',
+             'comfort_levels', 'avg_comfort')
+
+    def __init__(self, route, durations, costs, traffic, comforts, comfort_names, avg_comfort,
+                 departure=None, arrival=None, time_priority_cost=None, total_cost=None):
         """
-        Calculate the best route between two cities.
-        Priority can be "time", "cost", or "comfort".
+        route is a tuple of city names; durations and costs are array('d')
+        per segment; traffic holds TRAFFIC_LABELS indices and comforts
+        indices into comfort_names, one byte per segment. total_cost
+        defaults to the sum of costs.
         """
-        # Get city objects
-        start_city = self.get_city(start)
-        end_city = self.get_city(end)
-        
-        if not start_city or not end_city:
-            return None
-            
-        now = datetime.datetime.now()
+        setattr_ = object.__setattr__
+        setattr_(self, 'route', route)
+        setattr_(self, '_durations', durations)
+        setattr_(self, '_costs', costs)
+        setattr_(self, '_traffic', traffic)
+        setattr_(self, '_comforts', comforts)
+        setattr_(self, '_comfort_names', comfort_names)
+        setattr_(self, 'avg_comfort', avg_comfort)
+        setattr_(self, 'departure', departure)
+        setattr_(self, 'arrival', arrival)
+        setattr_(self, 'time_priority_cost', time_priority_cost)
+        setattr_(self, 'total_duration', sum(durations))
+        setattr_(self, 'total_cost', sum(costs) if total_cost is None else total_cost)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RouteResult is immutable; use replace()")
+
+    def __reduce__(self):
+        return (RouteResult, (self.route, self._durations, self._costs, self._traffic, self._comforts,
+                              self._comfort_names, self.avg_comfort, self.departure, self.arrival,
+                              self.time_priority_cost, self.total_cost))
+
+    def replace(self, costs=None, comfort_levels=None, total_cost=None, avg_comfort=None,
+                time_priority_cost=None):
+        """
+        Return a copy with new segment costs (a sequence of floats), one
+        comfort level name for every segment, totals or time_priority_cost.
+        """
+        comforts, comfort_names = self._comforts, self._comfort_names
+        if comfort_levels is not None:
+            comforts, comfort_names = bytes(len(comforts)), (comfort_levels,)
+        if costs is not None:
+            costs = array('d', costs)
+            total_cost = sum(costs) if total_cost is None else total_cost
+        return RouteResult(
+            self.route, self._durations, self._costs if costs is None else costs, self._traffic,
+            comforts, comfort_names, self.avg_comfort if avg_comfort is None else avg_comfort,
+            self.departure, self.arrival,
+            self.time_priority_cost if time_priority_cost is None else time_priority_cost,
+            self.total_cost if total_cost is None else total_cost,
+        )
+
+    def __getitem__(self, key):
+        if key == 'costs':
+            return tuple(self._costs)
+        if key == 'durations':
+            return tuple(self._durations)
+        if key == 'traffic_applied':
+            return tuple(TRAFFIC_LABELS[code] for code in self._traffic)
+        if key == 'comfort_levels':
+            names = self._comfort_names
+            return tuple(names[code] for code in self._comforts)
+        if key in self._KEYS or (key in ('departure', 'arrival') and self.departure is not None) \
+                or (key == 'time_priority_cost' and self.time_priority_cost is not None):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from self._KEYS
+        if self.departure is not None:
+            yield 'departure'
+            yield 'arrival'
+        if self.time_priority_cost is not None:
+            yield 'time_priority_cost'
+
+    def __len__(self):
+        return len(self._KEYS) + (2 if self.departure is not None else 0) \
+            + (1 if self.time_priority_cost is not None else 0)
+
+    def to_dict(self):
+        """Return the result as a plain dict, with lists for the per-segment values."""
+        return {key: list(value) if isinstance(value, tuple) else value for key, value in self.items()}
+
+    def format(self):
+        """Return the 'Complete Route' and 'Segment Details' lines that book_trip prints."""
+        route = self.route
+        names = self._comfort_names
+        lines = ["Complete Route:", f"  {' → '.join(route)}", "", "Segment Details:"]
+        for i in range(len(route) - 1):
+            lines.append(f"  {i+1}. {route[i]} → {route[i+1]}")
+            lines.append(f"     - Class: {names[self._comforts[i]]}")
+            lines.append(f"     - Cost: ₹{round(self._costs[i], 2)}")
+            lines.append(f"     - Duration: {int(self._durations[i])} mins (Traffic: {TRAFFIC_LABELS[self._traffic[i]]})")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return (f"RouteResult({' → '.join(self.route)}, total_duration={self.total_duration:.1f}, "
+                f"total_cost={self.total_cost:.2f}, avg_comfort={self.avg_comfort:.2f})")
+
+
+class Instrumentation:
+    """
+    Opt-in counters, timers and per-query traces for a TransportSystem,
+    see TransportSystem.enable_instrumentation.
+
+    counters holds totals of queries, city lookups, cache hits and misses
+    and the search counters of _record_search. timers holds seconds spent
+    in queries and city lookups. traces keeps one record per query, the
+    newest trace_limit of them, for export as JSON Lines or Prometheus
+    text.
+    """
+
+    COUNTERS = ('queries', 'city_lookups', 'cache_hits', 'cache_misses', 'searches', 'expanded',
+                'pushes', 'pops', 'decreases', 'relaxed', 'pruned')
+    TIMERS = ('query_seconds', 'city_lookup_seconds')
+    HELP = {
+        'queries': 'Route queries answered',
+        'city_lookups': 'City name lookups',
+        'cache_hits': 'Route cache hits',
+        'cache_misses': 'Route cache misses',
+        'searches': 'Graph searches run',
+        'expanded': 'Cities settled by searches',
+        'pushes': 'Priority queue pushes',
+        'pops': 'Priority queue pops',
+        'decreases': 'Priority queue decrease-key operations',
+        'relaxed': 'Edges scanned from settled cities',
+        'pruned': 'Edge relaxations that did not improve a label',
+        'query_seconds': 'Time spent answering route queries',
+        'city_lookup_seconds': 'Time spent looking up cities by name',
+    }
+
+    def __init__(self, trace_limit=1000):
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.timers = dict.fromkeys(self.TIMERS, 0.0)
+        self.traces = deque(maxlen=trace_limit)
+
+    def reset(self):
+        """Zero every counter and timer and drop the traces."""
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.timers = dict.fromkeys(self.TIMERS, 0.0)
+        self.traces.clear()
+
+    def record(self, trace):
+        """Add one query's trace (see TransportSystem._instrumented_route) to the totals."""
+        counters = self.counters
+        counters['queries'] += 1
+        for key in ('cache_hits', 'cache_misses', 'searches', 'expanded', 'pushes', 'pops', 'decreases',
+                    'relaxed', 'pruned'):
+            counters[key] += trace[key]
+        self.timers['query_seconds'] += trace['query_ms'] / 1000
+        self.traces.append(trace)
+
+    def record_lookup(self, seconds):
+        """Count one city lookup (see TransportSystem.get_city) that took seconds."""
+        self.counters['city_lookups'] += 1
+        self.timers['city_lookup_seconds'] += seconds
+
+    def write_traces(self, file):
+        """Write the kept traces to a text file object as JSON Lines; returns how many."""
+        for trace in self.traces:
+            file.write(json.dumps(trace) + '\n')
+        return len(self.traces)
+
+    def prometheus(self, prefix='busrouting'):
+        """Return the counters and timers in the Prometheus text exposition format."""
+        lines = []
+        for name, value in self.counters.items():
+            metric = f"{prefix}_{name}_total"
+            lines += [f"# HELP {metric} {self.HELP[name]}", f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, value in self.timers.items():
+            metric = f"{prefix}_{name}_total"
+            lines += [f"# HELP {metric} {self.HELP[name]}", f"# TYPE {metric} counter", f"{metric} {value:.6f}"]
+        return '\n'.join(lines) + '\n'
+
+
+TRAFFIC_LABELS = ('low', 'moderate', 'high')
+
+
+def _city_hash(name):
+    """Stable (process-independent) 32-bit hash of a case-folded city name."""
+    return zlib.crc32(name.lower().encode())
+
+
+def _traffic_code(hash_a, hash_b, salt):
+    """Map an unordered pair of city hashes to an index into TRAFFIC_LABELS."""
+    return ((((hash_a ^ hash_b) ^ salt) * 0x9E3779B1 & 0xFFFFFFFF) >> 16) % 3
+
+
+def _naive_local(moment):
+    """Convert an aware datetime to naive local time; naive ones are returned as is."""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone().replace(tzinfo=None)
+
+
+class TrafficModel:
+    """
+    Seedable traffic provider with one condition per route per time window.
+
+    A route's condition is derived from its endpoints, the window index and a
+    base value drawn once from the RNG. It therefore stays fixed for the whole
+    window and is the same in every search regardless of exploration order,
+    which keeps edge weights stable enough to cache and benchmark.
+    """
+
+    def __init__(self, seed=None, rng=None, window_minutes=60, clock=None):
+        if rng is None:
+            rng = random.Random(seed)
+        self.base = rng.getrandbits(32)
+        self.window_minutes = window_minutes
+        self.clock = clock or datetime.datetime.now
+
+    def regime(self, now=None):
+        """Return (window, weekend, is_rush_hour) for now (default: the clock)."""
+        now = _naive_local(self.clock() if now is None else now)
+        window = int(now.timestamp() // (self.window_minutes * 60))
         weekend = now.weekday() in [5, 6]
         is_rush_hour = 7 <= now.hour <= 9 or 17 <= now.hour <= 19
+        return window, weekend, is_rush_hour
+
+    def conditions(self, regime):
+        """Return the traffic factor for each condition label in a regime."""
+        _, weekend, is_rush_hour = regime
 
         # Traffic factors based on time of day and weekday/weekend
-        traffic_conditions = {
+        return {
             'low': 0.8 if not weekend else 0.9,
             'moderate': 1.0 if not weekend else 1.1,
             'high': 1.3 if not is_rush_hour else 1.6
         }
 
-        # Initialize the priority queue (custom heap)
-        priority_queue = MinHeap()
-        
-        # Format: (score, current_city_name, path, traffic_applied, costs, durations, comfort_levels)
-        priority_queue.push((0, start_city.name, [], [], [], [], []))
-        visited = {}
-
-        # Store all valid paths to find the best ones later
-        all_paths = []
-
-        while not priority_queue.is_empty():
-            score, current_name, path, traffic_applied, costs, durations, comforts = priority_queue.pop()
-
-            # Found the destination - store this path
-            if current_name.lower() == end_city.name.lower():
-                all_paths.append({
-                    'total_duration': sum(durations),
-                    'total_cost': sum(costs),
-                    'route': path + [current_name],
-                    'traffic_applied': traffic_applied,
-                    'costs': costs,
-                    'durations': durations,
-                    'comfort_levels': comforts,
-                    'avg_comfort': sum([self.comfort_levels[c]['comfort_score'] for c in comforts]) / len(comforts) if comforts else 0
-                })
-                continue
+    def _salt(self, window):
+        """Per-window salt mixed into every route's condition."""
+        return zlib.crc32(f"{self.base}:{window}".encode())
 
-            # Skip if we've found a better path to this city already
-            if current_name in visited and visited[current_name] <= score:
-                continue
-                
-            visited[current_name] = score
-            path = path + [current_name]
-
-            current_city = self.get_city(current_name)
-            for dest_name, comfort, cost, base_duration in current_city.connections:
-                # Skip cities we've already visited to avoid cycles
-                if dest_name in path:
-                    continue
-                    
-                # Determine traffic condition based on time of day
-                traffic = random.choice(list(traffic_conditions.keys()))
-                traffic_factor = traffic_conditions[traffic]
-                
-                # Apply weekend discount if applicable
-                weekend_discount = 0.9 if weekend else 1.0
-                
-                # Apply comfort level price factor
-                comfort_factor = self.comfort_levels[comfort]['price_factor']
-                final_cost = cost * weekend_discount * comfort_factor
-                
-                # Calculate adjusted duration
-                adjusted_duration = base_duration * traffic_factor
-                
-                # Calculate score based on priority
-                if priority == "cost":
-                    # Ensure cost is the primary priority
-                    new_score = score + (final_cost * 0.8)
-                elif priority == "comfort":
-                    # Higher comfort level = lower score (for min heap)
-                    comfort_score = 5 - self.comfort_levels[comfort]['comfort_score']
-                    # Prioritize comfort significantly
-                    new_score = score + (comfort_score * 5.0) + (adjusted_duration * 0.1) + (final_cost * 0.05)
-                else:  # Default to time priority
-                    new_score = score + adjusted_duration
-                    
-                priority_queue.push((
-                    new_score, 
-                    dest_name, 
-                    path, 
-                    traffic_applied + [traffic], 
-                    costs + [final_cost], 
-                    durations + [adjusted_duration],
-                    comforts + [comfort]
-                ))
-
-        if not all_paths:
-            return None  # No route found
-        
-        # Now select the best path based on priority
-        if priority == "cost":
-            # Sort by total cost (ascending)
-            all_paths.sort(key=lambda x: x['total_cost'])
-            return all_paths[0]
-        elif priority == "comfort":
-            # Filter for paths with comfort rating >= 3.5, then sort by comfort (descending)
-            comfort_paths = [p for p in all_paths if p['avg_comfort'] >= 3.0]
-            if comfort_paths:
-                comfort_paths.sort(key=lambda x: (-x['avg_comfort'], x['total_duration']))
-                selected_path = comfort_paths[0]
-                
-                # Make comfort priority cost exactly 2x the time priority cost
-                time_path = self.find_time_priority_path(start, end)
-                if time_path:
-                    time_cost = time_path['total_cost']
-                    # Adjust the costs to be exactly 2x the time priority cost
-                    cost_ratio = (time_cost * 2) / selected_path['total_cost']
-                    selected_path['costs'] = [cost * cost_ratio for cost in selected_path['costs']]
-                    selected_path['total_cost'] = time_cost * 2
-                
-                return selected_path
-            
-            # If no paths with high comfort rating, boost the most comfortable one
-            all_paths.sort(key=lambda x: -x['avg_comfort'])
-            selected_path = all_paths[0]
-            
-            # Update comfort levels to Premium for a better experience
-            selected_path['comfort_levels'] = ['Premium' for _ in selected_path['comfort_levels']]
-            selected_path['avg_comfort'] = 4.0  # Premium comfort level
-            
-            # Make comfort priority cost exactly 2x the time priority cost
-            time_path = self.find_time_priority_path(start, end)
-            if time_path:
-                time_cost = time_path['total_cost']
-                # Adjust the costs to be exactly 2x the time priority cost
-                selected_path['total_cost'] = time_cost * 2
-                # Distribute the cost proportionally among segments
-                total_segments = len(selected_path['costs'])
-                selected_path['costs'] = [(time_cost * 2) / total_segments] * total_segments
-            
-            return selected_path
-        else:  # time priority
-            # Sort by total duration (ascending)
-            all_paths.sort(key=lambda x: x['total_duration'])
-            return all_paths[0]
+    def condition(self, start, end, regime):
+        """Return the traffic label for the route between two city names."""
+        code = _traffic_code(_city_hash(start), _city_hash(end), self._salt(regime[0]))
+        return TRAFFIC_LABELS[code]
+
+    def edge_codes(self, snapshot, regime):
+        """Return a bytearray with the TRAFFIC_LABELS index of every snapshot edge."""
+        salt = self._salt(regime[0])
+        hashes = snapshot.city_hashes
+        if np is not None:
+            # The same arithmetic as _traffic_code, over every edge at once
+            hashes = np.frombuffer(hashes, dtype=np.uint32)
+            mixed = (hashes[np.frombuffer(snapshot.sources, dtype=np.int32)]
+                     ^ hashes[np.frombuffer(snapshot.targets, dtype=np.int32)] ^ np.uint32(salt))
+            codes = ((mixed.astype(np.uint64) * 0x9E3779B1 & 0xFFFFFFFF) >> 16) % 3
+            return bytearray(codes.astype(np.uint8).tobytes())
+        return bytearray(
+            _traffic_code(hashes[u], hashes[v], salt)
+            for u, v in zip(snapshot.sources, snapshot.targets)
+        )
+
+
+class City:
+    """Represents a city in the transportation network."""
     
-    def find_time_priority_path(self, start, end):
-        """Find the time priority path between two cities to use as reference."""
-        # Get city objects
-        start_city = self.get_city(start)
-        end_city = self.get_city(end)
-        
-        if not start_city or not end_city:
-            return None
-            
-        now = datetime.datetime.now()
-        weekend = now.weekday() in [5, 6]
-        is_rush_hour = 7 <= now.hour <= 9 or 17 <= now.hour <= 19
+    def __init__(self, name, city_id=None):
+        self.name = name
+        self.id = city_id  # Position in TransportSystem.city_list
+        self.connections = []  # List of (destination, comfort, cost, duration)
+        self.connected = set()  # Lower-cased destination names, for duplicate checks
+        self.coordinates = None  # Optional (latitude, longitude), used by A*
+        self.next_city = None
+    
+    def add_connection(self, destination, comfort, cost, duration):
+        # Check if connection already exists
+        key = destination.lower()
+        if key in self.connected:
+            return False
+        self.connected.add(key)
+        self.connections.append((destination, comfort, cost, duration))
+        return True
 
-        # Traffic factors
-        traffic_conditions = {
-            'low': 0.8 if not weekend else 0.9,
-            'moderate': 1.0 if not weekend else 1.1,
-            'high': 1.3 if not is_rush_hour else 1.6
-        }
 
-        # Initialize the priority queue (custom heap)
-        priority_queue = MinHeap()
-        priority_queue.push((0, start_city.name, [], [], [], [], []))
-        visited = {}
-        all_paths = []
-
-        while not priority_queue.is_empty():
-            score, current_name, path, traffic_applied, costs, durations, comforts = priority_queue.pop()
-
-            if current_name.lower() == end_city.name.lower():
-                all_paths.append({
-                    'total_duration': sum(durations),
-                    'total_cost': sum(costs),
-                    'route': path + [current_name],
-                    'traffic_applied': traffic_applied,
-                    'costs': costs,
-                    'durations': durations,
-                    'comfort_levels': comforts
-                })
-                continue
+class NetworkSnapshot:
+    """
+    Frozen compressed-sparse-row (CSR) view of a transport network.
 
-            if current_name in visited and visited[current_name] <= score:
-                continue
-                
-            visited[current_name] = score
-            path = path + [current_name]
+    Cities are integer ids (their position in TransportSystem.city_list) and
+    the outgoing edges of city u are the slots offsets[u]:offsets[u + 1] of
+    the flat edge arrays. Comfort classes are stored as small-int codes into
+    comfort_names. Every bidirectional route is two directed edges. A
+    closed route keeps its edge slots, with infinite cost and duration, so
+    that slot ids held by search trees stay valid until the next rebuild.
+    """
+
+    # Binary layout: header, then 8-byte aligned sections in SECTIONS order
+    MAGIC = b'BUSNET01'
+    HEADER = struct.Struct('<8sqqqq?7x')  # magic, cities, edges, name bytes, comfort bytes, little-endian
+    SECTIONS = (
+        ('name_offsets', 'q'), ('name_blob', 'B'), ('comfort_blob', 'B'),
+        ('offsets', 'q'), ('sources', 'i'), ('targets', 'i'), ('costs', 'd'),
+        ('durations', 'd'), ('comforts', 'b'), ('city_hashes', 'I'),
+    )
+
+    def __init__(self, names, offsets, targets, costs, durations, comforts, comfort_names,
+                 sources=None, city_hashes=None):
+        self.names = names
+        self.offsets = offsets  # array('q'), one slot per city plus one
+        self.targets = targets  # array('i'), destination id per edge
+        self.costs = costs  # array('d'), base cost per edge
+        self.durations = durations  # array('d'), base duration per edge
+        self.comforts = comforts  # array('b'), index into comfort_names
+        self.comfort_names = tuple(comfort_names)
+
+        # Source id per edge, so a predecessor edge is enough to walk a path back
+        if sources is None:
+            sources = array('i')
+            for city_id in range(len(names)):
+                sources.extend([city_id] * (offsets[city_id + 1] - offsets[city_id]))
+        self.sources = sources
+        if city_hashes is None:
+            city_hashes = array('I', [_city_hash(name) for name in names])
+        self.city_hashes = city_hashes
+        self.index = {name.lower(): city_id for city_id, name in enumerate(names)}
+        self._incoming = None
+
+    @classmethod
+    def from_transport(cls, transport):
+        """
+        Build a snapshot of a TransportSystem's current cities and routes.
+
+        This walks every City.connections tuple list, so it costs several
+        seconds per million routes; see from_routes for the bulk path.
+        """
+        comfort_names = list(transport.comfort_levels)
+        comfort_code = {name: code for code, name in enumerate(comfort_names)}
 
-            current_city = self.get_city(current_name)
-            for dest_name, comfort, cost, base_duration in current_city.connections:
-                if dest_name in path:
+        offsets = array('q', [0])
+        targets = array('i')
+        costs = array('d')
+        durations = array('d')
+        comforts = array('b')
+        for city in transport.city_list:
+            for dest_name, comfort, cost, duration in city.connections:
+                dest = transport.get_city(dest_name)
+                if dest is None:
                     continue
-                    
-                traffic = random.choice(list(traffic_conditions.keys()))
-                traffic_factor = traffic_conditions[traffic]
-                
-                weekend_discount = 0.9 if weekend else 1.0
-                comfort_factor = self.comfort_levels[comfort]['price_factor']
-                final_cost = cost * weekend_discount * comfort_factor
-                
-                adjusted_duration = base_duration * traffic_factor
-                
-                # For time priority, score is based on duration
-                new_score = score + adjusted_duration
-                    
-                priority_queue.push((
-                    new_score, 
-                    dest_name, 
-                    path, 
-                    traffic_applied + [traffic], 
-                    costs + [final_cost], 
-                    durations + [adjusted_duration],
-                    comforts + [comfort]
-                ))
-
-        if not all_paths:
-            return None
-        
-        # Sort by total duration (ascending) for time priority
-        all_paths.sort(key=lambda x: x['total_duration'])
-        return all_paths[0]
+                targets.append(dest.id)
+                costs.append(cost)
+                durations.append(duration)
+                comforts.append(comfort_code[comfort])
+            offsets.append(len(targets))
 
-    def book_trip(self, start, destination, priority="time"):
-        """Book a trip between two cities with specified priority."""
-        # Validate inputs
-        start = start.strip()
-        destination = destination.strip()
-        
-        if not start or not destination:
-            print("\nError: Both departure and destination cities must be provided.")
-            return False
-            
-        if start.lower() == destination.lower():
-            print("\nError: Departure and destination cities cannot be the same.")
-            return False
-            
-        start_city = self.get_city(start)
-        end_city = self.get_city(destination)
-        
-        if not start_city:
-            print(f"\nError: Departure city '{start}' not found in the system.")
-            return False
-            
-        if not end_city:
-            print(f"\nError: Destination city '{destination}' not found in the system.")
-            return False
-        
-        # Calculate the best route
-        result = self.calculate_best_route(start, destination, priority)
-        
-        if result:
-            route = result['route']
-            traffic_info = result['traffic_applied']
-            costs = result['costs']
-            durations = result['durations']
-            comfort_levels = result['comfort_levels']
-            total_cost = round(result['total_cost'], 2)
-            total_time = int(result['total_duration'])
-            
-            # Calculate average comfort score
-            comfort_scores = [self.comfort_levels[c]['comfort_score'] for c in comfort_levels]
-            avg_comfort = sum(comfort_scores) / len(comfort_scores) if comfort_scores else 0
-            comfort_rating = round(avg_comfort, 1)
-            
-            # Generate booking reference
-            booking_ref = f"BK{random.randint(10000, 99999)}"
-            
-            print("\n===== BOOKING SUCCESSFUL =====")
-            print(f"Booking Reference: {booking_ref}")
-            print(f"Journey: {start} → {destination}")
-            print(f"Optimization Priority: {priority.capitalize()}")
-            
-            # Display complete route with arrows
-            print("\nComplete Route:")
-            route_display = " → ".join(route)
-            print(f"  {route_display}")
-            
-            print("\nSegment Details:")
-            for i in range(len(route) - 1):
-                print(f"  {i+1}. {route[i]} → {route[i+1]}")
-                print(f"     - Class: {comfort_levels[i]}")
-                print(f"     - Cost: ₹{round(costs[i], 2)}")
-                print(f"     - Duration: {int(durations[i])} mins (Traffic: {traffic_info[i]})")
-                
-            print(f"\nTotal Cost: ₹{total_cost}")
-            print(f"Total Travel Time: {total_time} mins ({total_time//60}h {total_time%60}m)")
-            print(f"Comfort Rating: {comfort_rating}/4")
-            
-            # Show relative cost comparison if in comfort mode
-            if priority == "comfort":
-                time_path = self.find_time_priority_path(start, destination)
-                if time_path:
-                    time_cost = time_path['total_cost']
-                    print(f"Cost comparison: Comfort mode is exactly 2.0x the time priority cost")
-                    print(f"Time priority would cost: ₹{round(time_cost, 2)}")
-            
-            # Weather warning (simulated)
-            if random.random() < 0.3:
-                weather_conditions = ["rain", "fog", "high humidity", "high winds"]
-                weather = random.choice(weather_conditions)
-                print(f"\nWEATHER WARNING: Expect {weather} along parts of this route.")
-                
-            print("=============================")
-            return True
+        names = [city.name for city in transport.city_list]
+        return cls(names, offsets, targets, costs, durations, comforts, comfort_names)
+
+    @classmethod
+    def from_routes(cls, names, starts, ends, comforts, costs, durations, comfort_names):
+        """
+        Build a snapshot straight from route columns, without City objects.
+
+        starts and ends are city ids and comforts are codes into
+        comfort_names. Each row becomes two directed edges, and the edges
+        leave every city in row order, as from_transport lists them after
+        add_routes. from_transport walks per-city tuple lists, which is the
+        slow part for networks of a million routes; this is the bulk path
+        used by TransportSystem.add_route_arrays.
+        """
+        size = len(names)
+        offsets = array('q', [0]) * (size + 1)
+        for city_id in starts:
+            offsets[city_id + 1] += 1
+        for city_id in ends:
+            offsets[city_id + 1] += 1
+        for city_id in range(size):
+            offsets[city_id + 1] += offsets[city_id]
+
+        # Counting sort of both directions of every row by source city
+        count = offsets[size]
+        fill = offsets[:-1]
+        sources = array('i', [0]) * count
+        targets = array('i', [0]) * count
+        edge_costs = array('d', [0.0]) * count
+        edge_durations = array('d', [0.0]) * count
+        edge_comforts = array('b', [0]) * count
+        for start, end, code, cost, duration in zip(starts, ends, comforts, costs, durations):
+            for origin, dest in ((start, end), (end, start)):
+                slot = fill[origin]
+                fill[origin] = slot + 1
+                sources[slot] = origin
+                targets[slot] = dest
+                edge_costs[slot] = cost
+                edge_durations[slot] = duration
+                edge_comforts[slot] = code
+        return cls(names, offsets, targets, edge_costs, edge_durations, edge_comforts, comfort_names,
+                   sources=sources)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def num_edges(self):
+        """Number of directed edges (two per bidirectional route)."""
+        return len(self.targets)
+
+    def city_id(self, name):
+        """Return the id of a city name (case-insensitive), or None."""
+        return self.index.get(name.lower())
+
+    def edges(self, city_id):
+        """Return the range of edge slots leaving city_id."""
+        return range(self.offsets[city_id], self.offsets[city_id + 1])
+
+    def find_edge(self, origin, dest):
+        """Return the edge slot from city id origin to dest, or None."""
+        for edge in range(self.offsets[origin], self.offsets[origin + 1]):
+            if self.targets[edge] == dest:
+                return edge
+        return None
+
+    def update_edge(self, edge, cost, duration, comfort_code):
+        """Change one edge in place; a closed route has infinite cost and duration."""
+        if isinstance(self.costs, memoryview):
+            # Memory-mapped sections are read-only; copy them on first write
+            self.costs = array('d', self.costs)
+            self.durations = array('d', self.durations)
+            self.comforts = array('b', self.comforts)
+        self.costs[edge] = cost
+        self.durations[edge] = duration
+        self.comforts[edge] = comfort_code
+
+    def incoming(self):
+        """
+        Return (in_offsets, in_slots): the edge slots arriving at city v are
+        in_slots[in_offsets[v]:in_offsets[v + 1]]. Built on first use.
+        """
+        if self._incoming is None:
+            size = len(self.names)
+            in_offsets = array('q', [0]) * (size + 1)
+            for target in self.targets:
+                in_offsets[target + 1] += 1
+            for city_id in range(size):
+                in_offsets[city_id + 1] += in_offsets[city_id]
+            fill = in_offsets[:-1]
+            in_slots = array('i', [0]) * len(self.targets)
+            for edge, target in enumerate(self.targets):
+                in_slots[fill[target]] = edge
+                fill[target] += 1
+            self._incoming = (in_offsets, in_slots)
+        return self._incoming
+
+    def save(self, path):
+        """Write the snapshot in a binary format that load() can memory-map."""
+        encoded = [name.encode('utf-8') for name in self.names]
+        name_offsets = array('q', [0])
+        for name in encoded:
+            name_offsets.append(name_offsets[-1] + len(name))
+        name_blob = b''.join(encoded)
+        comfort_blob = '\n'.join(self.comfort_names).encode('utf-8')
+
+        sections = {
+            'name_offsets': name_offsets, 'name_blob': name_blob, 'comfort_blob': comfort_blob,
+            'offsets': self.offsets, 'sources': self.sources, 'targets': self.targets,
+            'costs': self.costs, 'durations': self.durations, 'comforts': self.comforts,
+            'city_hashes': self.city_hashes,
+        }
+        with open(path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, len(self.names), self.num_edges,
+                                     len(name_blob), len(comfort_blob), sys.byteorder == 'little'))
+            for field, typecode in self.SECTIONS:
+                data = sections[field]
+                if not isinstance(data, bytes):
+                    data = array(typecode, data).tobytes()
+                f.write(data)
+                f.write(b'\0' * (-len(data) % 8))
+
+    @classmethod
+    def load(cls, path, use_mmap=True):
+        """
+        Load a snapshot written by save().
+
+        With use_mmap the edge arrays are read-only memoryviews over a
+        memory-mapped file, so loading costs O(V) regardless of edge count and
+        the pages are shared between worker processes. Otherwise the arrays
+        are copied into memory.
+        """
+        with open(path, 'rb') as f:
+            if use_mmap:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+
+        magic, num_cities, num_edges, name_bytes, comfort_bytes, little_endian = \
+            cls.HEADER.unpack_from(buffer, 0)
+        if magic != cls.MAGIC:
+            raise ValueError(f"{path} is not a network snapshot")
+        if little_endian != (sys.byteorder == 'little'):
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+
+        lengths = {
+            'name_offsets': num_cities + 1, 'name_blob': name_bytes, 'comfort_blob': comfort_bytes,
+            'offsets': num_cities + 1, 'city_hashes': num_cities,
+        }
+        view = memoryview(buffer)
+        sections = {}
+        position = cls.HEADER.size
+        for field, typecode in cls.SECTIONS:
+            size = lengths.get(field, num_edges) * array(typecode).itemsize
+            data = view[position:position + size]
+            if typecode == 'B':
+                sections[field] = bytes(data)
+            elif use_mmap:
+                sections[field] = data.cast(typecode)
+            else:
+                sections[field] = array(typecode, data.tobytes())
+            position += size + (-size % 8)
+
+        name_offsets = sections['name_offsets']
+        name_blob = sections['name_blob']
+        names = [
+            name_blob[name_offsets[i]:name_offsets[i + 1]].decode('utf-8')
+            for i in range(num_cities)
+        ]
+        comfort_names = sections['comfort_blob'].decode('utf-8').split('\n')
+        return cls(names, sections['offsets'], sections['targets'], sections['costs'],
+                   sections['durations'], sections['comforts'], comfort_names,
+                   sources=sections['sources'], city_hashes=sections['city_hashes'])
+
+    def iter_routes(self):
+        """Yield each bidirectional route once as (start, end, comfort, cost, duration)."""
+        names = self.names
+        for edge in range(self.num_edges):
+            start, end = self.sources[edge], self.targets[edge]
+            if start < end and self.durations[edge] != float('inf'):
+                yield (names[start], names[end], self.comfort_names[self.comforts[edge]],
+                       self.costs[edge], self.durations[edge])
+
+    def to_numpy(self):
+        """Return zero-copy NumPy views of the edge arrays (requires NumPy)."""
+        if np is None:
+            raise ImportError("NumPy is required for NetworkSnapshot.to_numpy()")
+        return {
+            'offsets': np.frombuffer(self.offsets, dtype=np.int64),
+            'sources': np.frombuffer(self.sources, dtype=np.int32),
+            'targets': np.frombuffer(self.targets, dtype=np.int32),
+            'costs': np.frombuffer(self.costs, dtype=np.float64),
+            'durations': np.frombuffer(self.durations, dtype=np.float64),
+            'comforts': np.frombuffer(self.comforts, dtype=np.int8),
+            'city_hashes': np.frombuffer(self.city_hashes, dtype=np.uint32),
+        }
+
+
+WEEKEND_DISCOUNT = 0.9
+
+
+class EdgeMetrics:
+    """
+    Per-edge traffic, final cost, adjusted duration and comfort score of a
+    NetworkSnapshot for one traffic regime, used as search weights.
+
+    Each array is built on first use, so a regime only ever queried for
+    cost never hashes its traffic codes. The cost array depends only on the
+    weekend discount and is shared with `like`, the metrics of another
+    regime of the same snapshot, when their fares match; whichever builds it
+    first builds it for both. With NumPy the arrays are built
+    vectorized; either way they are array('d') for fast scalar indexing.
+
+    With regime=None the metrics are lower bounds valid for every regime
+    (lowest traffic factor, weekend discount applied), as used by ALT.
+    """
+
+    def __init__(self, snapshot, regime, comfort_levels, traffic_model, like=None):
+        self.snapshot = snapshot
+        self.regime = regime
+        self._traffic_model = traffic_model
+        if regime is None:
+            lowest = min(
+                min(traffic_model.conditions((None, weekend, is_rush_hour)).values())
+                for weekend in (False, True) for is_rush_hour in (False, True)
+            )
+            factors = [lowest] * len(TRAFFIC_LABELS)
+            weekend_discount = min(1.0, WEEKEND_DISCOUNT)
+            self._salt = None
         else:
-            print(f"\nNo route available from {start} to {destination}.")
-            return False
+            traffic_conditions = traffic_model.conditions(regime)
+            factors = [traffic_conditions[label] for label in TRAFFIC_LABELS]
+            weekend_discount = WEEKEND_DISCOUNT if regime[1] else 1.0
+            self._salt = traffic_model._salt(regime[0])
 
+        price = [weekend_discount * comfort_levels[c]['price_factor'] for c in snapshot.comfort_names]
+        # Higher comfort level = lower score (for min heap)
+        penalty = [(5 - comfort_levels[c]['comfort_score']) * 5.0 for c in snapshot.comfort_names]
+        self._factors = factors
+        self._price = price
+        self._penalty = penalty
+        self._discomfort_by_code = [5 - comfort_levels[c]['comfort_score'] for c in snapshot.comfort_names]
 
-def create_fully_connected_network(transport):
-    """Create a fully connected network where each city connects to every other city."""
-    # Get all cities
-    cities = []
-    temp = transport.head
-    while temp:
-        cities.append(temp.name)
-        temp = temp.next_city
-    
-    # Create comfort levels
-    comfort_levels = ['Economy', 'Standard', 'Premium', 'Express']
-    
-    # Connect every city with every other city
-    for i in range(len(cities)):
-        for j in range(i + 1, len(cities)):
-            # Calculate distance based on city names (just for simulation)
-            distance = len(cities[i]) + len(cities[j])
-            
-            # Calculate cost and duration based on distance
-            base_cost = distance * 50
-            base_duration = distance * 30
+        self._traffic = None
+        self._duration = None
+        self._comfort = None
+        self._discomfort = None
+        if like is not None and like.snapshot is snapshot and like._price == price:
+            self._fares = like._fares
+        else:
+            self._fares = {'cost': None}
+
+    @property
+    def traffic(self):
+        """Per-edge TRAFFIC_LABELS index, built on first use."""
+        if self._traffic is None:
+            if self.regime is None:
+                self._traffic = bytearray(self.snapshot.num_edges)
+            else:
+                self._traffic = self._traffic_model.edge_codes(self.snapshot, self.regime)
+        return self._traffic
+
+    @property
+    def duration(self):
+        """Per-edge duration under this regime's traffic, built on first use."""
+        if self._duration is None:
+            snapshot = self.snapshot
+            factors = self._factors
+            if np is not None:
+                codes = np.frombuffer(self.traffic, dtype=np.uint8)
+                values = np.frombuffer(snapshot.durations, dtype=np.float64) * np.array(factors)[codes]
+                self._duration = array('d', values.tobytes())
+            else:
+                self._duration = array('d', [d * factors[t] for d, t in zip(snapshot.durations, self.traffic)])
+        return self._duration
+
+    @property
+    def cost(self):
+        """Per-edge fare after the comfort level's price factor, built on first use."""
+        fares = self._fares
+        if fares['cost'] is None:
+            snapshot = self.snapshot
+            price = self._price
+            if np is not None:
+                codes = np.frombuffer(snapshot.comforts, dtype=np.int8)
+                values = np.frombuffer(snapshot.costs, dtype=np.float64) * np.array(price)[codes]
+                fares['cost'] = array('d', values.tobytes())
+            else:
+                fares['cost'] = array('d', [c * price[k] for c, k in zip(snapshot.costs, snapshot.comforts)])
+        return fares['cost']
+
+    @property
+    def comfort(self):
+        """Per-edge comfort search weight, built on first use from duration and cost."""
+        if self._comfort is None:
+            snapshot = self.snapshot
+            penalty = self._penalty
+            duration = self.duration
+            cost = self.cost
+            if np is not None:
+                codes = np.frombuffer(snapshot.comforts, dtype=np.int8)
+                values = (np.array(penalty)[codes] + np.frombuffer(duration, dtype=np.float64) * 0.1
+                          + np.frombuffer(cost, dtype=np.float64) * 0.05)
+                self._comfort = array('d', values.tobytes())
+            else:
+                self._comfort = array('d', [
+                    penalty[k] + (d * 0.1) + (c * 0.05)
+                    for k, d, c in zip(snapshot.comforts, duration, cost)
+                ])
+        return self._comfort
+
+    @property
+    def discomfort(self):
+        """Per-edge 5 - comfort_score: the additive comfort criterion, built on first use."""
+        if self._discomfort is None:
+            by_code = self._discomfort_by_code
+            self._discomfort = array('d', [by_code[k] for k in self.snapshot.comforts])
+        return self._discomfort
+
+    def segments(self, edges):
+        """
+        Return (durations, costs, traffic codes) of the given edge slots,
+        reading the arrays that are built and computing the rest per edge.
+        """
+        snapshot = self.snapshot
+        if self._traffic is not None:
+            traffic = bytes([self._traffic[edge] for edge in edges])
+        elif self.regime is None:
+            traffic = bytes(len(edges))
+        else:
+            hashes = snapshot.city_hashes
+            traffic = bytes([_traffic_code(hashes[snapshot.sources[edge]], hashes[snapshot.targets[edge]], self._salt)
+                             for edge in edges])
+        if self._duration is not None:
+            durations = array('d', [self._duration[edge] for edge in edges])
+        else:
+            factors = self._factors
+            durations = array('d', [snapshot.durations[edge] * factors[code] for edge, code in zip(edges, traffic)])
+        if self._fares['cost'] is not None:
+            cost = self._fares['cost']
+            costs = array('d', [cost[edge] for edge in edges])
+        else:
+            price = self._price
+            costs = array('d', [snapshot.costs[edge] * price[snapshot.comforts[edge]] for edge in edges])
+        return durations, costs, traffic
+
+    def update_edges(self, edges, patched=None):
+        """
+        Recompute the metrics of the given edge slots after the snapshot
+        changed them. The built arrays are replaced by patched copies, so
+        holders of the old weights (such as a ContractionHierarchy) see the
+        change. patched lists the shared fares already patched by other
+        EdgeMetrics in the same update, so a shared cost array is patched once.
+        """
+        if patched is None:
+            patched = []
+        snapshot = self.snapshot
+        fares = self._fares
+        if fares['cost'] is not None and not any(fares is other for other in patched):
+            cost = fares['cost'] = array('d', fares['cost'])
+            price = self._price
+            for edge in edges:
+                cost[edge] = snapshot.costs[edge] * price[snapshot.comforts[edge]]
+            patched.append(fares)
+        if self._duration is not None:
+            self._duration = array('d', self._duration)
+            traffic = self.traffic
+            for edge in edges:
+                self._duration[edge] = snapshot.durations[edge] * self._factors[traffic[edge]]
+        if self._comfort is not None:
+            self._comfort = array('d', self._comfort)
+            duration = self.duration
+            cost = self.cost
+            for edge in edges:
+                code = snapshot.comforts[edge]
+                self._comfort[edge] = self._penalty[code] + (duration[edge] * 0.1) + (cost[edge] * 0.05)
+        if self._discomfort is not None:
+            self._discomfort = array('d', self._discomfort)
+            for edge in edges:
+                self._discomfort[edge] = self._discomfort_by_code[snapshot.comforts[edge]]
+
+    def weights(self, priority):
+        """Return the edge weight array that a search for priority minimizes."""
+        if priority == "cost":
+            return self.cost
+        if priority == "comfort":
+            return self.comfort
+        return self.duration  # Default to time priority
+
+
+class TrafficProfile:
+    """
+    Departure-time-aware durations of every NetworkSnapshot edge.
+
+    There is one breakpoint at the start of each traffic window, for
+    `windows` windows from the one containing start. Between breakpoints an
+    edge's duration is interpolated linearly, and after the last one it stays
+    constant. Durations are kept in one window-major float32 array and
+    traffic codes in a bytearray, so a lookup is O(1).
+
+    To keep the profile FIFO (leaving later never arrives earlier), each
+    breakpoint is capped at one window plus the next breakpoint, since
+    waiting for the next window is never worse. That keeps every slope at
+    -1 or more, so arrival time never falls as departure time rises.
+    """
+
+    def __init__(self, snapshot, traffic_model, start, windows=24):
+        self.snapshot = snapshot
+        self.window_minutes = traffic_model.window_minutes
+        first = traffic_model.regime(start)[0]
+        self.start = datetime.datetime.fromtimestamp(first * self.window_minutes * 60)
+        self.windows = windows
+
+        self.codes = bytearray()  # TRAFFIC_LABELS index per window and edge
+        self.factors = []  # Traffic factor per TRAFFIC_LABELS index, per window
+        for index in range(windows):
+            regime = traffic_model.regime(self.start + datetime.timedelta(minutes=index * self.window_minutes))
+            conditions = traffic_model.conditions(regime)
+            self.codes += traffic_model.edge_codes(snapshot, regime)
+            self.factors.append([conditions[label] for label in TRAFFIC_LABELS])
+
+        self.durations = array('f', [0.0]) * (snapshot.num_edges * windows)
+        for edge in range(snapshot.num_edges):
+            self._fill(edge)
+
+    def _fill(self, edge):
+        """Compute the FIFO-capped breakpoints of one edge, latest first."""
+        size = self.snapshot.num_edges
+        base = self.snapshot.durations[edge]
+        following = float('inf')
+        for index in range(self.windows - 1, -1, -1):
+            slot = index * size + edge
+            value = base * self.factors[index][self.codes[slot]]
+            self.durations[slot] = min(value, following + self.window_minutes)
+            following = self.durations[slot]
+
+    def update_edges(self, edges):
+        """Recompute the profiles of edges whose base duration changed."""
+        for edge in edges:
+            self._fill(edge)
+
+    def offset(self, moment):
+        """Minutes from the profile start to a datetime (aware ones count in local time)."""
+        return (_naive_local(moment) - self.start).total_seconds() / 60
+
+    def covers(self, moment, windows=None):
+        """True if moment falls in the first `windows` windows (default: half the profile)."""
+        if windows is None:
+            windows = self.windows // 2
+        return 0 <= self.offset(moment) < windows * self.window_minutes
+
+    def duration(self, edge, minute):
+        """Duration of edge when entered `minute` minutes after the profile start."""
+        position = max(minute, 0.0) / self.window_minutes
+        index = int(position)
+        size = self.snapshot.num_edges
+        if index >= self.windows - 1:
+            return self.durations[(self.windows - 1) * size + edge]
+        slot = index * size + edge
+        current = self.durations[slot]
+        if current == float('inf'):
+            return current  # Closed route
+        return current + (self.durations[slot + size] - current) * (position - index)
+
+    def traffic_code(self, edge, minute):
+        """TRAFFIC_LABELS index of edge in the window containing minute."""
+        index = min(int(max(minute, 0.0) // self.window_minutes), self.windows - 1)
+        return self.codes[index * self.snapshot.num_edges + edge]
+
+
+def _degree_sum(offsets, cities):
+    """Total number of edges leaving cities in a CSR offsets array."""
+    return sum([offsets[city + 1] - offsets[city] for city in cities])
+
+
+def _record_search(stats, queues, expanded, relaxed):
+    """
+    Add one search's counters to a stats dict: 'searches', 'expanded'
+    (settled cities), heap 'pushes', 'pops' and 'decreases', 'relaxed'
+    (edges scanned from settled cities) and 'pruned' (relaxations that did
+    not improve a label). Searches count after the fact from their heaps
+    and settled sets, so the loops pay nothing when stats is None.
+    """
+    pushes = sum([queue.pushes for queue in queues])
+    pops = pushes - sum([len(queue) for queue in queues])
+    decreases = sum([queue.decreases for queue in queues])
+    improved = pushes - len(queues) + decreases  # Each queue starts with one pushed endpoint
+    for key, value in (('searches', 1), ('expanded', expanded), ('pushes', pushes), ('pops', pops),
+                       ('decreases', decreases), ('relaxed', relaxed), ('pruned', relaxed - improved)):
+        stats[key] = stats.get(key, 0) + value
+
+
+def dijkstra(snapshot, weights, source, stop_at=None, stats=None):
+    """
+    Label-setting Dijkstra search over a NetworkSnapshot.
+
+    Keeps one distance and one predecessor edge per city. Improved distances
+    lower the queued entry in place with decrease_key, so no city is ever
+    queued twice. If stop_at (a collection of city ids) is given, the search
+    stops as soon as all of them are settled. Returns (dist, pred) where pred
+    maps a city id to the edge slot it was reached through. If stats is a
+    dict, the search's counters are added to it, see _record_search.
+    """
+    offsets = snapshot.offsets
+    targets = snapshot.targets
+    remaining = set(stop_at) if stop_at is not None else None
+
+    dist = {source: 0}
+    pred = {}
+    settled = set()
+    priority_queue = IndexedMinHeap()
+    priority_queue.push(source, 0)
+
+    while priority_queue:
+        current, score = priority_queue.pop()
+        settled.add(current)
+
+        if remaining is not None:
+            remaining.discard(current)
+            if not remaining:
+                break
+
+        for edge in range(offsets[current], offsets[current + 1]):
+            dest = targets[edge]
+            if dest in settled:
+                continue
+            new_score = score + weights[edge]
+            if dest not in dist:
+                priority_queue.push(dest, new_score)
+            elif new_score < dist[dest]:
+                priority_queue.decrease_key(dest, new_score)
+            else:
+                continue
+            dist[dest] = new_score
+            pred[dest] = edge
+
+    if stats is not None:
+        stopped = current if remaining is not None and not remaining else None
+        _record_search(stats, (priority_queue,), len(settled),
+                       _degree_sum(offsets, settled) - _degree_sum(offsets, (stopped,) if stopped is not None else ()))
+    return dist, pred
+
+
+def time_dependent_dijkstra(profile, source, departure, target=None, stats=None):
+    """
+    Earliest-arrival Dijkstra over a TrafficProfile.
+
+    Labels are arrival times in minutes since profile.start, starting from
+    departure at source. Each edge is entered when the search reaches its
+    origin, so its duration depends on that time. Because the profile is
+    FIFO, the first label a city settles with is its earliest arrival. Stops
+    once target is settled. Returns (arrival, pred) and fills stats like
+    dijkstra.
+    """
+    snapshot = profile.snapshot
+    offsets = snapshot.offsets
+    targets = snapshot.targets
+    duration = profile.duration
+
+    arrival = {source: departure}
+    pred = {}
+    settled = set()
+    priority_queue = IndexedMinHeap()
+    priority_queue.push(source, departure)
+
+    while priority_queue:
+        current, current_time = priority_queue.pop()
+        settled.add(current)
+        if current == target:
+            break
+
+        for edge in range(offsets[current], offsets[current + 1]):
+            dest = targets[edge]
+            if dest in settled:
+                continue
+            new_time = current_time + duration(edge, current_time)
+            if dest not in arrival:
+                priority_queue.push(dest, new_time)
+            elif new_time < arrival[dest]:
+                priority_queue.decrease_key(dest, new_time)
+            else:
+                continue
+            arrival[dest] = new_time
+            pred[dest] = edge
+
+    if stats is not None:
+        unscanned = (target,) if target in settled else ()
+        _record_search(stats, (priority_queue,), len(settled),
+                       _degree_sum(offsets, settled) - _degree_sum(offsets, unscanned))
+    return arrival, pred
+
+
+def reverse_dijkstra(snapshot, weights, target, stop_at=None):
+    """
+    Dijkstra over incoming edges: distances from every city to target.
+    Returns (dist, succ) where succ maps a city id to the edge slot it leaves by.
+    If stop_at (a collection of city ids) is given, the search stops as soon
+    as all of them are settled; dist then also holds tentative labels, none
+    smaller than the last settled distance.
+    """
+    sources = snapshot.sources
+    in_offsets, in_slots = snapshot.incoming()
+
+    remaining = set(stop_at) if stop_at is not None else None
+
+    dist = {target: 0}
+    succ = {}
+    settled = set()
+    priority_queue = IndexedMinHeap()
+    priority_queue.push(target, 0)
+
+    while priority_queue:
+        current, score = priority_queue.pop()
+        settled.add(current)
+
+        if remaining is not None:
+            remaining.discard(current)
+            if not remaining:
+                break
+
+        for slot in range(in_offsets[current], in_offsets[current + 1]):
+            edge = in_slots[slot]
+            origin = sources[edge]
+            if origin in settled:
+                continue
+            new_score = score + weights[edge]
+            if origin not in dist:
+                priority_queue.push(origin, new_score)
+            elif new_score < dist[origin]:
+                priority_queue.decrease_key(origin, new_score)
+            else:
+                continue
+            dist[origin] = new_score
+            succ[origin] = edge
+
+    return dist, succ
+
+
+def repair_tree(snapshot, weights, dist, pred, changed):
+    """
+    Repair a full shortest-path tree (dist, pred as returned by dijkstra) in
+    place after the weights of the edge slots in changed were modified.
+
+    Only the affected part is touched. Subtrees that hang off a changed
+    tree edge are detached and re-attached through their cheapest incoming
+    edge from the rest of the tree. Cities that a changed edge now reaches
+    more cheaply are improved. Both then propagate with a Dijkstra that only
+    visits cities whose distance changes. Returns the number of cities settled.
+    """
+    offsets = snapshot.offsets
+    targets = snapshot.targets
+    sources = snapshot.sources
+
+    detached = set()
+    stack = [targets[edge] for edge in changed if pred.get(targets[edge]) == edge]
+    while stack:
+        current = stack.pop()
+        if current in detached:
+            continue
+        detached.add(current)
+        for edge in range(offsets[current], offsets[current + 1]):
+            if pred.get(targets[edge]) == edge:
+                stack.append(targets[edge])
+    for city_id in detached:
+        del dist[city_id]
+        del pred[city_id]
+
+    # Cheapest (score, edge) into each detached or improved city
+    candidates = {}
+    if detached:
+        in_offsets, in_slots = snapshot.incoming()
+        for city_id in detached:
+            for slot in range(in_offsets[city_id], in_offsets[city_id + 1]):
+                edge = in_slots[slot]
+                origin = sources[edge]
+                if origin in dist:
+                    score = dist[origin] + weights[edge]
+                    if city_id not in candidates or score < candidates[city_id][0]:
+                        candidates[city_id] = (score, edge)
+    for edge in changed:
+        origin, dest = sources[edge], targets[edge]
+        if origin in dist and dest in dist:
+            score = dist[origin] + weights[edge]
+            if score < dist[dest] and (dest not in candidates or score < candidates[dest][0]):
+                candidates[dest] = (score, edge)
+
+    priority_queue = IndexedMinHeap()
+    for city_id, (score, edge) in candidates.items():
+        dist[city_id] = score
+        pred[city_id] = edge
+        priority_queue.push(city_id, score)
+
+    settled = set()
+    while priority_queue:
+        current, score = priority_queue.pop()
+        settled.add(current)
+        for edge in range(offsets[current], offsets[current + 1]):
+            dest = targets[edge]
+            if dest in settled:
+                continue
+            new_score = score + weights[edge]
+            if dest not in dist:
+                priority_queue.push(dest, new_score)
+            elif new_score < dist[dest]:
+                if not priority_queue.decrease_key(dest, new_score):
+                    priority_queue.push(dest, new_score)
+            else:
+                continue
+            dist[dest] = new_score
+            pred[dest] = edge
+
+    return len(settled)
+
+
+def _path_edges(snapshot, pred, source, target):
+    """Walk a predecessor-edge map back from target; returns the edge slots in order."""
+    edges = []
+    current = target
+    while current != source:
+        edge = pred[current]
+        edges.append(edge)
+        current = snapshot.sources[edge]
+    edges.reverse()
+    return edges
+
+
+def bidirectional_dijkstra(snapshot, weights, source, target, stats=None):
+    """
+    Point-to-point Dijkstra that searches forward from source and backward
+    from target (over incoming edges) at the same time.
+
+    Always expands the side with the smaller queue and stops as soon as the
+    two queue minima add up to at least the best meeting distance seen, which
+    proves that route optimal. Returns the route's edge slots, or None if
+    target is unreachable. If stats is a dict, the counters of both sides
+    are added to it, see _record_search.
+    """
+    if source == target:
+        return []
+
+    offsets = snapshot.offsets
+    targets = snapshot.targets
+    sources = snapshot.sources
+    in_offsets, in_slots = snapshot.incoming()
+
+    dist_forward = {source: 0}
+    dist_backward = {target: 0}
+    pred = {}  # city -> edge slot reaching it from the source side
+    succ = {}  # city -> edge slot leaving it towards the target side
+    settled_forward = set()
+    settled_backward = set()
+    forward_queue = IndexedMinHeap()
+    forward_queue.push(source, 0)
+    backward_queue = IndexedMinHeap()
+    backward_queue.push(target, 0)
+    best = float('inf')
+    meeting = None
+
+    while forward_queue and backward_queue:
+        if forward_queue.peek()[1] + backward_queue.peek()[1] >= best:
+            break
+
+        if len(forward_queue) <= len(backward_queue):
+            current, score = forward_queue.pop()
+            settled_forward.add(current)
+            for edge in range(offsets[current], offsets[current + 1]):
+                dest = targets[edge]
+                if dest in settled_forward:
+                    continue
+                new_score = score + weights[edge]
+                if dest not in dist_forward:
+                    forward_queue.push(dest, new_score)
+                elif new_score < dist_forward[dest]:
+                    forward_queue.decrease_key(dest, new_score)
+                else:
+                    continue
+                dist_forward[dest] = new_score
+                pred[dest] = edge
+                if dest in dist_backward and new_score + dist_backward[dest] < best:
+                    best = new_score + dist_backward[dest]
+                    meeting = dest
+        else:
+            current, score = backward_queue.pop()
+            settled_backward.add(current)
+            for slot in range(in_offsets[current], in_offsets[current + 1]):
+                edge = in_slots[slot]
+                origin = sources[edge]
+                if origin in settled_backward:
+                    continue
+                new_score = score + weights[edge]
+                if origin not in dist_backward:
+                    backward_queue.push(origin, new_score)
+                elif new_score < dist_backward[origin]:
+                    backward_queue.decrease_key(origin, new_score)
+                else:
+                    continue
+                dist_backward[origin] = new_score
+                succ[origin] = edge
+                if origin in dist_forward and new_score + dist_forward[origin] < best:
+                    best = new_score + dist_forward[origin]
+                    meeting = origin
+
+    if stats is not None:
+        _record_search(stats, (forward_queue, backward_queue), len(settled_forward) + len(settled_backward),
+                       _degree_sum(offsets, settled_forward) + _degree_sum(in_offsets, settled_backward))
+    if meeting is None:
+        return None
+
+    edges = _path_edges(snapshot, pred, source, meeting)
+    current = meeting
+    while current != target:
+        edge = succ[current]
+        edges.append(edge)
+        current = targets[edge]
+    return edges
+
+
+def astar(snapshot, weights, source, target, heuristic, stats=None):
+    """
+    A* search guided by heuristic(city_id), a consistent lower bound on the
+    remaining weight to target (infinity prunes the city). Stops as soon as
+    target is settled. Returns the route's edge slots, or None if target is
+    unreachable. If stats is a dict, the search's counters are added to it,
+    see _record_search.
+    """
+    offsets = snapshot.offsets
+    targets = snapshot.targets
+    infinity = float('inf')
+
+    g_score = {source: 0}
+    h_score = {source: heuristic(source)}
+    pred = {}
+    settled = set()
+    priority_queue = IndexedMinHeap()
+    priority_queue.push(source, h_score[source])
+    found = False
+
+    while priority_queue:
+        current, _ = priority_queue.pop()
+        settled.add(current)
+        if current == target:
+            found = True
+            break
+
+        score = g_score[current]
+        for edge in range(offsets[current], offsets[current + 1]):
+            dest = targets[edge]
+            if dest in settled:
+                continue
+            new_score = score + weights[edge]
+            if dest not in g_score:
+                estimate = heuristic(dest)
+                h_score[dest] = estimate
+                if estimate == infinity:
+                    settled.add(dest)  # Cannot reach target from here
+                    continue
+                priority_queue.push(dest, new_score + estimate)
+            elif new_score < g_score[dest]:
+                priority_queue.decrease_key(dest, new_score + h_score[dest])
+            else:
+                continue
+            g_score[dest] = new_score
+            pred[dest] = edge
+
+    if stats is not None:
+        # Cities pruned by the heuristic count as settled but were never scanned
+        scanned = [city for city in settled if h_score.get(city) != infinity and city != target]
+        _record_search(stats, (priority_queue,), len(settled), _degree_sum(offsets, scanned))
+    if not found:
+        return None
+    return _path_edges(snapshot, pred, source, target)
+
+
+def _spur_search(snapshot, weights, source, target, bound, skip_edges, skip_cities):
+    """
+    A* for one spur of k_shortest_paths: the best route from source to
+    target that takes none of the edge slots in skip_edges and passes none
+    of the cities in skip_cities. bound(city) is a consistent lower bound on
+    the remaining weight. Returns (weight, edge slots), or None.
+    """
+    offsets = snapshot.offsets
+    targets = snapshot.targets
+
+    g_score = {source: 0}
+    pred = {}
+    settled = set(skip_cities)
+    priority_queue = IndexedMinHeap()
+    priority_queue.push(source, bound(source))
+
+    while priority_queue:
+        current, _ = priority_queue.pop()
+        if current == target:
+            return g_score[target], _path_edges(snapshot, pred, source, target)
+        settled.add(current)
+
+        score = g_score[current]
+        for edge in range(offsets[current], offsets[current + 1]):
+            dest = targets[edge]
+            if dest in settled or edge in skip_edges:
+                continue
+            new_score = score + weights[edge]
+            if dest not in g_score:
+                priority_queue.push(dest, new_score + bound(dest))
+            elif new_score < g_score[dest]:
+                priority_queue.decrease_key(dest, new_score + bound(dest))
+            else:
+                continue
+            g_score[dest] = new_score
+            pred[dest] = edge
+    return None
+
+
+def k_shortest_paths(snapshot, weights, source, target, k, tree=None):
+    """
+    Yen's algorithm: up to k loopless routes from source to target, as
+    (weight, edge slots) pairs in increasing weight. Routes are distinct.
+
+    One reverse shortest-path tree from target is shared by every spur.
+    tree is (dist, succ, reach) from reverse_dijkstra towards target, where
+    every city closer than reach is settled; by default one is grown until
+    it settles source. Inside the tree its distances are exact remaining
+    weights, and beyond it reach is a lower bound. Each spur (a deviation
+    from an accepted route at one of its cities) is queued by the best
+    bound over its allowed first edges, and only resolved when it reaches
+    the front of the queue. If the tree path below that first edge avoids
+    the route's root, it is the spur route and no search is needed;
+    otherwise _spur_search runs A* on the bound. Most spurs never reach the
+    front, so most are never searched.
+    """
+    if k <= 0:
+        return []
+    if source == target:
+        return [(0, [])]
+
+    offsets = snapshot.offsets
+    targets = snapshot.targets
+    infinity = float('inf')
+    if tree is None or not tree[0].get(source, infinity) <= tree[2]:
+        dist_to, succ = reverse_dijkstra(snapshot, weights, target, (source,))
+        reach = dist_to.get(source, infinity)
+    else:
+        dist_to, succ, reach = tree
+    radius = dist_to.get(source, infinity)
+    if radius == infinity:
+        return []
+
+    def bound(city):
+        distance = dist_to.get(city, reach)
+        return distance if distance < reach else reach
+
+    def tree_path(city):
+        edges = []
+        while city != target:
+            edge = succ[city]
+            edges.append(edge)
+            city = targets[edge]
+        return edges
+
+    def route_cities(edges):
+        return [source] + [targets[edge] for edge in edges]
+
+    def best_deviation(spur, skip_edges, skip_cities):
+        """Cheapest allowed first edge from spur by weight plus bound: (value, edge slot)."""
+        best, best_edge = infinity, None
+        for edge in range(offsets[spur], offsets[spur + 1]):
+            dest = targets[edge]
+            if edge in skip_edges or dest in skip_cities:
+                continue
+            value = weights[edge] + bound(dest)
+            if value < best:
+                best, best_edge = value, edge
+        return best, best_edge
+
+    first = tree_path(source)
+    paths = [(radius, first, route_cities(first))]  # Accepted routes, best first
+    seen = {tuple(first)}  # Accepted and queued complete routes
+    # Candidate records: (accepted route index, spur index, root weight, complete edges or None)
+    candidates = []
+    priority_queue = IndexedMinHeap()
+
+    def queue_spurs(path_index, deviation):
+        """Queue the spurs of a newly accepted route from its deviation index on."""
+        _, edges, cities = paths[path_index]
+        root_cities = set(cities[:deviation])
+        root_weight = sum([weights[edge] for edge in edges[:deviation]])
+        sharing = [other for _, other, _ in paths if other[:deviation] == edges[:deviation]]
+        for index in range(deviation, len(edges)):
+            skip_edges = {other[index] for other in sharing if len(other) > index}
+            best, _ = best_deviation(cities[index], skip_edges, root_cities)
+            if best < infinity:
+                priority_queue.push(len(candidates), root_weight + best)
+                candidates.append((path_index, index, root_weight, None))
+            root_cities.add(cities[index])
+            root_weight += weights[edges[index]]
+            sharing = [other for other in sharing if len(other) > index and other[index] == edges[index]]
+
+    queue_spurs(0, 0)
+    while priority_queue and len(paths) < k:
+        candidate_id, weight = priority_queue.pop()
+        path_index, index, root_weight, complete = candidates[candidate_id]
+        if complete is not None:
+            if weight == infinity:
+                break  # Only closed routes are left
+            paths.append((weight, complete, route_cities(complete)))
+            queue_spurs(len(paths) - 1, index)
+            continue
+
+        # Resolve the spur against every route accepted so far
+        _, edges, cities = paths[path_index]
+        root = edges[:index]
+        spur = cities[index]
+        skip_edges = {other[index] for _, other, _ in paths if len(other) > index and other[:index] == root}
+        skip_cities = set(cities[:index])
+        best, best_edge = best_deviation(spur, skip_edges, skip_cities)
+        if best_edge is None:
+            continue
+        if root_weight + best > weight:
+            priority_queue.push(candidate_id, root_weight + best)  # Newer routes raised the bound
+            continue
+
+        spur_route = None
+        head = targets[best_edge]
+        if dist_to.get(head, infinity) <= reach:
+            tail = tree_path(head)
+            skip_cities.add(spur)
+            if head not in skip_cities and not any(targets[edge] in skip_cities for edge in tail):
+                spur_route = (best, [best_edge] + tail)
+            skip_cities.discard(spur)
+        if spur_route is None:
+            spur_route = _spur_search(snapshot, weights, spur, target, bound, skip_edges, skip_cities)
+        if spur_route is None:
+            continue
+
+        route = root + spur_route[1]
+        key = tuple(route)
+        if key not in seen:
+            seen.add(key)
+            priority_queue.push(len(candidates), root_weight + spur_route[0])
+            candidates.append((path_index, index, root_weight, route))
+
+    return [(weight, edges) for weight, edges, _ in paths]
+
+
+class LandmarkTable:
+    """
+    ALT (A*, landmarks, triangle inequality) lower bounds for one weighting.
+
+    Stores exact distances from and to a few landmark cities, picked by
+    farthest-point selection. By the triangle inequality,
+    d(L, t) - d(L, v) and d(v, L) - d(t, L) are lower bounds on d(v, t).
+    Built on lower-bound edge weights, the table stays admissible for every
+    traffic regime.
+    """
+
+    def __init__(self, snapshot, weights, count=8):
+        self.snapshot = snapshot
+        self.landmarks = []
+        self.distance_from = []  # Per landmark: array of d(L, v)
+        self.distance_to = []  # Per landmark: array of d(v, L)
+
+        size = len(snapshot)
+        if size == 0:
+            return
+        infinity = float('inf')
+        # Start from the best-connected city, then repeatedly take the city
+        # farthest from all landmarks chosen so far
+        degrees = [snapshot.offsets[i + 1] - snapshot.offsets[i] for i in range(size)]
+        landmark = max(range(size), key=degrees.__getitem__)
+        nearest = [infinity] * size
+
+        for _ in range(min(count, size)):
+            dist, _ = dijkstra(snapshot, weights, landmark)
+            distance_from = array('d', [infinity]) * size
+            for city_id, value in dist.items():
+                distance_from[city_id] = value
+            dist, _ = reverse_dijkstra(snapshot, weights, landmark)
+            distance_to = array('d', [infinity]) * size
+            for city_id, value in dist.items():
+                distance_to[city_id] = value
+
+            self.landmarks.append(landmark)
+            self.distance_from.append(distance_from)
+            self.distance_to.append(distance_to)
+
+            for city_id in range(size):
+                if distance_from[city_id] < nearest[city_id]:
+                    nearest[city_id] = distance_from[city_id]
+            reachable = [city_id for city_id in range(size)
+                         if nearest[city_id] != infinity and city_id not in self.landmarks]
+            if reachable:
+                landmark = max(reachable, key=nearest.__getitem__)
+            else:
+                # Everything reachable is covered; seed the next unreached component
+                unreached = [city_id for city_id in range(size) if nearest[city_id] == infinity]
+                if not unreached:
+                    break
+                landmark = unreached[0]
+
+    def heuristic(self, target):
+        """Return a function giving a lower bound on d(v, target) for city v."""
+        infinity = float('inf')
+        # Only landmarks that reach the target in both directions give bounds
+        terms = [
+            (distance_from, distance_from[target], distance_to, distance_to[target])
+            for distance_from, distance_to in zip(self.distance_from, self.distance_to)
+            if distance_from[target] != infinity and distance_to[target] != infinity
+        ]
+
+        def lower_bound(city_id):
+            bound = 0.0
+            for distance_from, from_target, distance_to, to_target in terms:
+                estimate = from_target - distance_from[city_id]
+                if estimate > bound:
+                    bound = estimate
+                estimate = distance_to[city_id] - to_target
+                if estimate > bound:
+                    bound = estimate
+            return bound
+
+        return lower_bound
+
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy (CH) over one edge weighting of a NetworkSnapshot.
+
+    Cities are contracted one at a time, least important first. Contracting
+    a city adds a shortcut between each pair of its remaining neighbours
+    whose shortest connection ran through it, unless a bounded witness
+    search finds another route that is no longer. A query then only follows
+    arcs towards more important cities, from both ends, so it settles a small
+    fraction of the network. Each shortcut remembers the city it bypasses,
+    which lets a route unpack back into snapshot edge slots.
+
+    The contraction order and the shortcuts added at every step are kept, so
+    update() can repair the hierarchy after the graph or its weights change
+    by re-contracting only from the least important changed city upwards.
+    """
+
+    ESTIMATE_LIMIT = 32  # Cities settled per witness search when ordering
+
+    def __init__(self, snapshot, weights, witness_limit=128):
+        self.snapshot = snapshot
+        self.weights = weights
+        self.witness_limit = witness_limit  # Cities settled per witness search
+        self.order = []  # Contraction order, least important first
+        self.rank = []  # City id -> position in order
+        self.history = []  # Per contraction step: the (origin, dest, weight, middle) shortcuts added
+        self._base = self._base_edges()  # City id -> {dest: weight} of the snapshot edges
+        self._contract(0)
+
+    def _base_edges(self):
+        """Return the cheapest snapshot edge weight per (origin, dest) pair."""
+        base = [{} for _ in range(len(self.snapshot))]
+        weights = self.weights
+        for edge, (origin, dest) in enumerate(zip(self.snapshot.sources, self.snapshot.targets)):
+            if origin != dest and weights[edge] < base[origin].get(dest, float('inf')):
+                base[origin][dest] = weights[edge]
+        return base
+
+    def update(self, snapshot, weights):
+        """
+        Repair the hierarchy for a changed snapshot or weighting.
+
+        New cities are ranked above all others. When edges are only added or
+        made cheaper, contraction steps below the least important city with
+        a changed edge are replayed from history, since their shortcuts and
+        witnesses still hold; only the steps from there on are redone, in
+        the same order. A heavier or removed edge may have been an earlier
+        step's witness, so then every step is redone, still in the saved
+        order. Returns the number of cities re-contracted.
+        """
+        old_base = self._base
+        self.snapshot = snapshot
+        self.weights = weights
+        self._base = self._base_edges()
+
+        size = len(snapshot)
+        if size < len(self.order):
+            # Cities were removed; no rank can be trusted
+            self.order = []
+            self.history = []
+            self._contract(0)
+            return size
+
+        start = len(self.order)
+        self.order.extend(range(len(self.order), size))
+        rank = [0] * size
+        for position, city_id in enumerate(self.order):
+            rank[city_id] = position
+
+        infinity = float('inf')
+        for city_id, edges in enumerate(self._base):
+            old_edges = old_base[city_id] if city_id < len(old_base) else {}
+            if edges == old_edges:
+                continue
+            for dest in edges.keys() | old_edges.keys():
+                weight = edges.get(dest, infinity)
+                old_weight = old_edges.get(dest, infinity)
+                if weight < old_weight:
+                    start = min(start, rank[city_id], rank[dest])
+                elif weight > old_weight:
+                    # Any earlier witness search may have relied on this edge
+                    start = 0
+
+        self._contract(start)
+        return size - start
+
+    def repaired(self, snapshot, weights):
+        """
+        Return a copy repaired with update(), leaving this hierarchy as it
+        is so that it can be read while the copy is built.
+        """
+        hierarchy = copy.copy(self)
+        # update() changes these two lists in place; everything else it replaces
+        hierarchy.order = list(self.order)
+        hierarchy.history = list(self.history)
+        hierarchy.update(snapshot, weights)
+        return hierarchy
+
+    def _contract(self, start):
+        """Rebuild the arcs, replaying contraction steps before start and redoing the rest."""
+        size = len(self.snapshot)
+        self._out_arcs = out_arcs = [{} for _ in range(size)]
+        self._in_arcs = in_arcs = [{} for _ in range(size)]
+
+        # Arcs are (weight, middle city or -1, edge slot or -1)
+        slots = {}
+        for edge, (origin, dest) in enumerate(zip(self.snapshot.sources, self.snapshot.targets)):
+            if self._base[origin].get(dest) == self.weights[edge]:
+                slots[origin, dest] = edge
+        for (origin, dest), edge in slots.items():
+            arc = (self.weights[edge], -1, edge)
+            out_arcs[origin][dest] = arc
+            in_arcs[dest][origin] = arc
+        for step in self.history[:start]:
+            for origin, dest, weight, middle in step:
+                self._add_arc(origin, dest, weight, middle)
+        del self.history[start:]
+
+        # Weights of the arcs between cities not contracted yet; witness
+        # searches run on this shrinking graph rather than the growing arc set
+        contracted = set(self.order[:start])
+        self._live_out = [
+            {dest: arc[0] for dest, arc in arcs.items() if dest not in contracted}
+            if city_id not in contracted else {}
+            for city_id, arcs in enumerate(out_arcs)
+        ]
+        self._live_in = [
+            {origin: arc[0] for origin, arc in arcs.items() if origin not in contracted}
+            if city_id not in contracted else {}
+            for city_id, arcs in enumerate(in_arcs)
+        ]
+
+        for city_id in self.order[start:]:
+            self._contract_city(city_id)
+
+        if len(self.order) < size:
+            # Order the remaining cities by edge difference plus contracted
+            # neighbours, re-evaluating lazily when a city reaches the top
+            deleted = [0] * size
+            queue = IndexedMinHeap(
+                (city_id, self._importance(city_id, deleted))
+                for city_id in range(size) if city_id not in contracted
+            )
+            while queue:
+                city_id, _ = queue.pop()
+                importance = self._importance(city_id, deleted)
+                if queue and importance > queue.peek()[1]:
+                    queue.push(city_id, importance)
+                    continue
+                for neighbour in self._live_out[city_id].keys() | self._live_in[city_id].keys():
+                    deleted[neighbour] += 1
+                self._contract_city(city_id)
+                self.order.append(city_id)
+        self._live_out = self._live_in = None
+
+        self.rank = rank = [0] * size
+        for position, city_id in enumerate(self.order):
+            rank[city_id] = position
+        # Upward arcs: forward from each city, and backward into each city
+        self.up = [
+            [(dest, arc[0]) for dest, arc in out_arcs[city_id].items() if rank[dest] > rank[city_id]]
+            for city_id in range(size)
+        ]
+        self.down = [
+            [(origin, arc[0]) for origin, arc in in_arcs[city_id].items() if rank[origin] > rank[city_id]]
+            for city_id in range(size)
+        ]
+
+    def _add_arc(self, origin, dest, weight, middle):
+        """Add a shortcut unless an arc between the same cities is no heavier."""
+        current = self._out_arcs[origin].get(dest)
+        if current is None or weight < current[0]:
+            arc = (weight, middle, -1)
+            self._out_arcs[origin][dest] = arc
+            self._in_arcs[dest][origin] = arc
+            return True
+        return False
+
+    def _contract_city(self, city_id):
+        """Contract one city, recording the shortcuts it needs as the next step."""
+        shortcuts, _ = self._shortcuts(city_id)
+        live_out = self._live_out
+        live_in = self._live_in
+        for origin, dest, weight, middle in shortcuts:
+            if self._add_arc(origin, dest, weight, middle):
+                live_out[origin][dest] = weight
+                live_in[dest][origin] = weight
+        self.history.append(shortcuts)
+
+        for dest in live_out[city_id]:
+            del live_in[dest][city_id]
+        for origin in live_in[city_id]:
+            del live_out[origin][city_id]
+        live_out[city_id] = {}
+        live_in[city_id] = {}
+
+    def _importance(self, city_id, deleted):
+        """Shortcuts added minus arcs removed by contracting city_id, plus contracted neighbours."""
+        shortcuts, degree = self._shortcuts(city_id, self.ESTIMATE_LIMIT)
+        return len(shortcuts) - degree + deleted[city_id]
+
+    def _shortcuts(self, city_id, settle_limit=None):
+        """
+        Return (shortcuts, arcs removed) for contracting city_id now. A lower
+        settle_limit than witness_limit gives a cheaper, pessimistic estimate.
+        """
+        incoming = self._live_in[city_id]
+        outgoing = self._live_out[city_id]
+        shortcuts = []
+        if not incoming or not outgoing:
+            return shortcuts, len(incoming) + len(outgoing)
+
+        max_out = max(outgoing.values())
+        for origin, in_weight in incoming.items():
+            goals = outgoing.keys() - {origin}
+            if not goals:
+                continue
+            dist = self._witness_search(origin, city_id, goals, in_weight + max_out,
+                                        settle_limit or self.witness_limit)
+            for dest, out_weight in outgoing.items():
+                if dest != origin and dist.get(dest, float('inf')) > in_weight + out_weight:
+                    shortcuts.append((origin, dest, in_weight + out_weight, city_id))
+        return shortcuts, len(incoming) + len(outgoing)
+
+    def _witness_search(self, source, skip, goals, limit, settle_limit):
+        """
+        Bounded Dijkstra from source among uncontracted cities, avoiding skip.
+        Ignores routes longer than limit and stops after settle_limit cities or
+        once every goal is settled. Returns tentative distances, each a real
+        route length.
+        """
+        live_out = self._live_out
+        remaining = set(goals)
+        dist = {source: 0}
+        settled = 0
+        priority_queue = IndexedMinHeap()
+        priority_queue.push(source, 0)
+
+        while priority_queue and settled < settle_limit:
+            current, score = priority_queue.pop()
+            settled += 1
+            remaining.discard(current)
+            if not remaining:
+                break
+            for dest, weight in live_out[current].items():
+                if dest == skip:
+                    continue
+                new_score = score + weight
+                if new_score > limit:
+                    continue
+                if dest not in dist:
+                    priority_queue.push(dest, new_score)
+                elif new_score < dist[dest]:
+                    priority_queue.decrease_key(dest, new_score)
+                else:
+                    continue
+                dist[dest] = new_score
+
+        return dist
+
+    def query(self, source, target, stats=None):
+        """
+        Bidirectional upward search between two city ids.
+
+        Each side only relaxes arcs towards more important cities and stops
+        once its queue minimum reaches the best meeting distance. Returns the
+        route's snapshot edge slots, or None if target is unreachable. If
+        stats is a dict, the search's counters are added to it, see
+        _record_search.
+        """
+        if source == target:
+            return []
+
+        graphs = (self.up, self.down)
+        dist = ({source: 0}, {target: 0})
+        parent = ({}, {})  # Side -> city -> neighbour it was reached from
+        queues = (IndexedMinHeap(), IndexedMinHeap())
+        queues[0].push(source, 0)
+        queues[1].push(target, 0)
+        best = float('inf')
+        meeting = None
+        expanded = 0
+
+        while True:
+            open_sides = [side for side in (0, 1) if queues[side] and queues[side].peek()[1] < best]
+            if not open_sides:
+                break
+            side = min(open_sides, key=lambda s: queues[s].peek()[1])
+            current, score = queues[side].pop()
+            expanded += 1
+
+            other = dist[1 - side].get(current)
+            if other is not None and score + other < best:
+                best = score + other
+                meeting = current
+
+            side_dist = dist[side]
+            for neighbour, weight in graphs[side][current]:
+                new_score = score + weight
+                if neighbour not in side_dist:
+                    queues[side].push(neighbour, new_score)
+                elif new_score < side_dist[neighbour]:
+                    queues[side].decrease_key(neighbour, new_score)
+                else:
+                    continue
+                side_dist[neighbour] = new_score
+                parent[side][neighbour] = current
+
+        if stats is not None:
+            relaxed = sum(len(graphs[side][city]) for side in (0, 1)
+                          for city in dist[side] if city not in queues[side])
+            _record_search(stats, queues, expanded, relaxed)
+        if meeting is None:
+            return None
+
+        arcs = []
+        current = meeting
+        while current != source:
+            previous = parent[0][current]
+            arcs.append((previous, current))
+            current = previous
+        arcs.reverse()
+        current = meeting
+        while current != target:
+            following = parent[1][current]
+            arcs.append((current, following))
+            current = following
+        return self._unpack(arcs)
+
+    def _unpack(self, arcs):
+        """Expand (origin, dest) arcs, shortcuts included, into snapshot edge slots."""
+        out_arcs = self._out_arcs
+        edges = []
+        stack = arcs[::-1]
+        while stack:
+            origin, dest = stack.pop()
+            _, middle, edge = out_arcs[origin][dest]
+            if middle == -1:
+                edges.append(edge)
+            else:
+                stack.append((middle, dest))
+                stack.append((origin, middle))
+        return edges
+
+
+def _haversine_km(first, second):
+    """Great-circle distance in km between two (latitude, longitude) pairs."""
+    lat1, lon1 = map(math.radians, first)
+    lat2, lon2 = map(math.radians, second)
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _dominates(values, other, epsilon):
+    """True if values is no worse than other (within 1 + epsilon) on every criterion."""
+    scale = 1.0 + epsilon
+    for value, other_value in zip(values, other):
+        if value > other_value * scale:
+            return False
+    return True
+
+
+def pareto_search(snapshot, criteria, source, target, max_labels=16, epsilon=0.0):
+    """
+    Multi-criteria label-setting search for the Pareto front between two cities.
+
+    criteria is a tuple of per-edge weight arrays (for example duration, cost
+    and discomfort). Each city keeps a bag of non-dominated labels, so partial
+    routes that are worse on every criterion are dropped as soon as they
+    appear. Labels pop in lexicographic order, so a label that reaches the
+    target is final. To keep bags bounded, a label is also dropped when it is
+    within a factor of 1 + epsilon of an existing one, or when its city
+    already holds max_labels labels; both make the front an approximation.
+
+    Returns a list of (values, edges) pairs for the target, ordered by the
+    first criterion, where edges are the snapshot edge slots of the route.
+    """
+    offsets = snapshot.offsets
+    targets = snapshot.targets
+    zero = tuple(0.0 for _ in criteria)
+
+    # Label records are (values, city, parent label id, edge slot)
+    labels = [(zero, source, -1, -1)]
+    alive = [True]
+    bags = {source: [0]}
+    front = []
+
+    priority_queue = IndexedMinHeap()
+    priority_queue.push(0, zero)
+
+    while priority_queue:
+        label_id, values = priority_queue.pop()
+        if not alive[label_id]:
+            continue
+        current = labels[label_id][1]
+
+        if current == target:
+            front.append(label_id)
+            continue
+
+        for edge in range(offsets[current], offsets[current + 1]):
+            dest = targets[edge]
+            if dest == source:
+                continue
+            new_values = tuple(value + weights[edge] for value, weights in zip(values, criteria))
+
+            # Skip labels dominated at the target or at their own city
+            if any(_dominates(labels[other][0], new_values, epsilon) for other in front):
+                continue
+            bag = bags.setdefault(dest, [])
+            if any(_dominates(labels[other][0], new_values, epsilon) for other in bag):
+                continue
+
+            # Drop queued labels the new one dominates, then respect the cap
+            kept = []
+            for other in bag:
+                if _dominates(new_values, labels[other][0], 0.0):
+                    alive[other] = False
+                else:
+                    kept.append(other)
+            if len(kept) >= max_labels:
+                bags[dest] = kept
+                continue
+
+            new_id = len(labels)
+            labels.append((new_values, dest, label_id, edge))
+            alive.append(True)
+            kept.append(new_id)
+            bags[dest] = kept
+            priority_queue.push(new_id, new_values)
+
+    results = []
+    for label_id in front:
+        values = labels[label_id][0]
+        edges = []
+        while labels[label_id][2] != -1:
+            edges.append(labels[label_id][3])
+            label_id = labels[label_id][2]
+        edges.reverse()
+        results.append((values, edges))
+    return results
+
+
+class TransportSystem:
+    """Manages a linked list of cities and routes between them."""
+    
+    def __init__(self, cache_size=1024, traffic_model=None):
+        self.head = None
+        self.tail = None
+        self.cities = {}  # Lower-cased name -> City, for O(1) lookups
+        self.city_list = []  # City id -> City, in insertion order
+        self.comfort_levels = {
+            'Economy': {'price_factor': 1.0, 'satisfaction': 'Basic comfort', 'comfort_score': 1},
+            'Standard': {'price_factor': 1.3, 'satisfaction': 'Comfortable journey', 'comfort_score': 2},
+            'Premium': {'price_factor': 2.0, 'satisfaction': 'Luxury experience', 'comfort_score': 4},
+            'Express': {'price_factor': 1.5, 'satisfaction': 'Fast service', 'comfort_score': 3}
+        }
+        # Provides one stable traffic condition per route per time window
+        self.traffic_model = traffic_model if traffic_model is not None else TrafficModel()
+        # Results keyed on (start_id, end_id, priority, traffic regime)
+        self.route_cache = RouteCache(cache_size)
+        # Optional precomputed shortest-path trees, see precompute_all_pairs
+        self.all_pairs = None
+        # CSR view of the graph and its per-regime edge weights, built lazily
+        self._snapshot = None
+        self._metrics = OrderedDict()  # Regime -> EdgeMetrics, see _edge_metrics
+        # A* lower bounds, tied to the current snapshot
+        self._lower_bounds = None
+        self._landmarks = {}
+        self._coordinate_ratios = {}
+        # Contraction hierarchies per priority; repaired, not dropped, after changes
+        self._hierarchies = {}
+        self._hierarchy_repairs = {}  # Priority -> future of a repaired copy, see _hierarchy
+        self._repair_executor = None  # Background thread for those repairs, started on first use
+        # Departure-time-aware durations, see _traffic_profile
+        self._profile = None
+        # Reverse shortest-path trees shared by k_best_routes queries, see _reverse_tree
+        self._reverse_trees = OrderedDict()
+        # Set by from_snapshot: City.connections are only filled in on demand
+        self._detached = False
+        # Opt-in counters and traces, see enable_instrumentation
+        self.instrumentation = None
+        self._query_stats = None  # Search counters of the instrumented query in progress
+
+    @classmethod
+    def from_snapshot(cls, snapshot, **kwargs):
+        """
+        Create a TransportSystem that queries a NetworkSnapshot directly.
+
+        Only the city registry is built up front; per-city connection lists
+        are materialized the first time the graph is modified.
+        """
+        transport = cls(**kwargs)
+        previous = None
+        for city_id, name in enumerate(snapshot.names):
+            city = City(name, city_id)
+            transport.cities[name.lower()] = city
+            transport.city_list.append(city)
+            if previous is None:
+                transport.head = city
+            else:
+                previous.next_city = city
+            previous = city
+        transport.tail = previous
+        transport._snapshot = snapshot
+        transport._detached = True
+        return transport
+
+    @classmethod
+    def load_snapshot(cls, path, use_mmap=True, **kwargs):
+        """Load a binary snapshot written by save_snapshot, ready to query."""
+        return cls.from_snapshot(NetworkSnapshot.load(path, use_mmap), **kwargs)
+
+    def save_snapshot(self, path):
+        """Write the current network as a memory-mappable binary snapshot."""
+        self.snapshot().save(path)
+        
+    def add_city(self, name):
+        """Add a city to the transport system."""
+        # Check if city already exists
+        key = name.lower()
+        if key in self.cities:
+            return False
             
-            # Select a random comfort level
-            comfort = random.choice(comfort_levels)
+        city = City(name, len(self.city_list))
+        self.cities[key] = city
+        self.city_list.append(city)
+        self._invalidate_routes()
+
+        # Keep the linked list in sync for callers that walk it
+        if not self.head:
+            self.head = city
+        else:
+            self.tail.next_city = city
+        self.tail = city
+        return True
+
+    def add_route(self, start, end, comfort, cost, duration):
+        """Add a bidirectional route between two cities."""
+        origin = self.get_city(start)
+        destination = self.get_city(end)
+        
+        if not origin or not destination:
+            return False
+
+        self._materialize_connections()
+        # Add bidirectional connection
+        added = origin.add_connection(end, comfort, cost, duration)
+        added = destination.add_connection(start, comfort, cost, duration) or added
+        if added:
+            self._invalidate_routes()
+        return True
+
+    def add_routes(self, routes, add_missing_cities=False):
+        """
+        Add many bidirectional routes in one pass.
+
+        routes is any iterable or generator of (start, end, comfort, cost,
+        duration) rows. Duplicates, self-loops and rows naming unknown cities
+        are skipped (unknown cities are created when add_missing_cities is
+        set). Cached routes are invalidated once at the end rather than per
+        route. Returns the number of routes added.
+        """
+        self._materialize_connections()
+        cities = self.cities
+        added = 0
+        for start, end, comfort, cost, duration in routes:
+            start_key = start.lower()
+            end_key = end.lower()
+            if start_key == end_key:
+                continue
+
+            origin = cities.get(start_key)
+            destination = cities.get(end_key)
+            if origin is None or destination is None:
+                if not add_missing_cities:
+                    continue
+                if origin is None:
+                    self.add_city(start)
+                    origin = cities[start_key]
+                if destination is None:
+                    self.add_city(end)
+                    destination = cities[end_key]
+
+            # Inline add_connection to skip the per-call overhead
+            if end_key not in origin.connected:
+                origin.connected.add(end_key)
+                origin.connections.append((end, comfort, cost, duration))
+                added += 1
+            if start_key not in destination.connected:
+                destination.connected.add(start_key)
+                destination.connections.append((start, comfort, cost, duration))
+
+        if added:
+            self._invalidate_routes()
+        return added
+
+    def update_route(self, start, end, comfort=None, cost=None, duration=None):
+        """
+        Change the comfort class, cost or duration of an existing route (both
+        directions), e.g. for a fare change or a delay. Unlike add_route this
+        keeps precomputed routes, see _change_route. Returns False, and
+        changes nothing, if there is no such route or comfort is not one of
+        comfort_levels.
+        """
+        return self._change_route(start, end, comfort, cost, duration)
+
+    def remove_route(self, start, end):
+        """Close the route between two cities (both directions); False if there is none."""
+        return self._change_route(start, end, remove=True)
+
+    def _change_route(self, start, end, comfort=None, cost=None, duration=None, remove=False):
+        """
+        Apply a route update or closure and repair what depends on it.
+
+        The snapshot and the current EdgeMetrics are patched at the route's
+        two edge slots (a closed route gets infinite cost and duration).
+        Precomputed all-pairs trees are repaired with repair_tree, and only
+        the cached routes the change can affect are evicted. Contraction
+        hierarchies repair themselves on their next query.
+        """
+        origin = self.get_city(start)
+        destination = self.get_city(end)
+        if not origin or not destination:
+            return False
+        if comfort is not None and comfort not in self.comfort_levels:
+            return False
+
+        self._materialize_connections()
+        changed = []
+        for city, other in ((origin, destination), (destination, origin)):
+            key = other.name.lower()
+            for index, connection in enumerate(city.connections):
+                if connection[0].lower() != key:
+                    continue
+                if remove:
+                    del city.connections[index]
+                    city.connected.discard(key)
+                    changed.append((city, other, connection, None))
+                else:
+                    updated = (connection[0],
+                               connection[1] if comfort is None else comfort,
+                               connection[2] if cost is None else cost,
+                               connection[3] if duration is None else duration)
+                    city.connections[index] = updated
+                    changed.append((city, other, connection, updated))
+                break
+        if not changed:
+            return False
+
+        snapshot = self._snapshot
+        if snapshot is None:
+            return True  # Nothing built from the graph yet
+        if comfort is not None and comfort not in snapshot.comfort_names:
+            self._invalidate_routes()
+            return True
+
+        edges = []
+        for city, other, _, updated in changed:
+            edge = snapshot.find_edge(city.id, other.id)
+            if edge is None:
+                continue
+            if updated is None:
+                snapshot.update_edge(edge, float('inf'), float('inf'), snapshot.comforts[edge])
+            else:
+                snapshot.update_edge(edge, updated[2], updated[3], snapshot.comfort_names.index(updated[1]))
+            edges.append(edge)
+
+        lowered = self._lowered_priorities(changed)
+        self._repair_routes(edges, changed, lowered)
+        return True
+
+    def _lowered_priorities(self, changed):
+        """Priorities whose weight the change lowers for some edge, in any regime."""
+        lowered = set()
+        for _, _, old, new in changed:
+            if new is None:
+                continue  # Closing a route never lowers a weight
+            old_class = self.comfort_levels[old[1]]
+            new_class = self.comfort_levels[new[1]]
+            faster = new[3] < old[3]
+            cheaper = new[2] * new_class['price_factor'] < old[2] * old_class['price_factor']
+            if faster:
+                lowered.add("time")
+            if cheaper:
+                lowered.add("cost")
+            if faster or cheaper or new_class['comfort_score'] > old_class['comfort_score']:
+                lowered.add("comfort")
+        return lowered
+
+    def _repair_routes(self, edges, changed, lowered):
+        """Patch edge weights, repair all-pairs trees and evict affected cached routes."""
+        patched = []
+        for metrics in self._metrics.values():
+            if metrics.snapshot is self._snapshot:
+                metrics.update_edges(edges, patched)
+
+        if self._profile is not None and self._profile.snapshot is self._snapshot:
+            self._profile.update_edges(edges)
+        if self._lower_bounds is not None:
+            self._lower_bounds.update_edges(edges)
+            # Landmark and coordinate bounds only stay admissible if no weight fell
+            for priority in lowered:
+                self._landmarks.pop(priority, None)
+                self._coordinate_ratios.pop(priority, None)
+
+        if self.all_pairs:
+            regime = self.all_pairs['regime']
+            metrics = self._edge_metrics(regime)
+            for priority, trees in self.all_pairs['trees'].items():
+                weights = metrics.weights(priority)
+                for dist, pred in zip(self.all_pairs['dists'][priority], trees):
+                    repair_tree(metrics.snapshot, weights, dist, pred, edges)
+
+        # Drop cached routes over the changed segments, and every route of a
+        # priority that may now have a cheaper path
+        segments = {(city.id, other.id) for city, other, _, _ in changed}
+
+        def affected(key, result):
+            if key[2] in lowered:
+                return True
+            if result is None:
+                return False
+            route = [self.get_city(name).id for name in result['route']]
+            return any(segment in segments for segment in zip(route, route[1:]))
+
+        evicted = self.route_cache.evict(affected)
+        # Comfort results are priced from the time route, so they follow it
+        stale_time = {(start, end, regime) for start, end, priority, regime in evicted if priority == "time"}
+        self.route_cache.evict(lambda key, _: key[2] == "comfort" and (key[0], key[1], key[3]) in stale_time)
+
+    def add_route_arrays(self, starts, ends, comforts, costs, durations, add_missing_cities=False):
+        """
+        Add routes given as parallel columns (lists, arrays or NumPy arrays).
+
+        Rows are filtered like add_routes. On a system without routes the
+        snapshot is built straight from the columns with
+        NetworkSnapshot.from_routes, and City.connections are only filled in
+        when the graph is next modified, as after from_snapshot.
+        """
+        columns = [
+            column.tolist() if hasattr(column, 'tolist') else column
+            for column in (starts, ends, comforts, costs, durations)
+        ]
+        if self._detached or any(city.connected for city in self.city_list):
+            return self.add_routes(zip(*columns), add_missing_cities)
+
+        # Resolve names to ids with C-level maps rather than a per-row loop
+        cities = self.cities
+        start_keys = list(map(str.lower, columns[0]))
+        end_keys = list(map(str.lower, columns[1]))
+        id_of = {key: city.id for key, city in cities.items()}
+        start_ids = list(map(id_of.get, start_keys))
+        end_ids = list(map(id_of.get, end_keys))
+        if add_missing_cities and (None in start_ids or None in end_ids):
+            for start, end, start_key, end_key in zip(columns[0], columns[1], start_keys, end_keys):
+                if start_key == end_key:
+                    continue
+                for name, key in ((start, start_key), (end, end_key)):
+                    if key not in id_of:
+                        self.add_city(name)
+                        id_of[key] = cities[key].id
+            start_ids = list(map(id_of.get, start_keys))
+            end_ids = list(map(id_of.get, end_keys))
+
+        # Keep the first row of each city pair, as add_routes does
+        seen = set()
+        rows = []
+        for row, (start, end) in enumerate(zip(start_ids, end_ids)):
+            if start is None or end is None or start == end:
+                continue
+            pair = (start, end) if start < end else (end, start)
+            if pair not in seen:
+                seen.add(pair)
+                rows.append(row)
+        if len(rows) < len(start_ids):
+            start_ids, end_ids, *columns = [[column[row] for row in rows]
+                                            for column in (start_ids, end_ids, *columns)]
+        if not rows:
+            return 0
+
+        comfort_code = {name: code for code, name in enumerate(self.comfort_levels)}
+        self._invalidate_routes()
+        self._snapshot = NetworkSnapshot.from_routes(
+            [city.name for city in self.city_list], start_ids, end_ids,
+            array('b', map(comfort_code.__getitem__, columns[2])), columns[3], columns[4],
+            list(self.comfort_levels),
+        )
+        self._detached = True
+        return len(rows)
+
+    def _materialize_connections(self):
+        """Fill City.connections from the snapshot a detached system was loaded from."""
+        if not self._detached:
+            return
+        self._detached = False
+        snapshot = self._snapshot
+        for city in self.city_list[:len(snapshot)]:
+            for edge in snapshot.edges(city.id):
+                if snapshot.durations[edge] == float('inf'):
+                    continue  # Closed route
+                dest_name = snapshot.names[snapshot.targets[edge]]
+                city.connected.add(dest_name.lower())
+                city.connections.append((dest_name, snapshot.comfort_names[snapshot.comforts[edge]],
+                                         snapshot.costs[edge], snapshot.durations[edge]))
+
+    def _invalidate_routes(self):
+        """Forget cached and precomputed routes after the graph changes."""
+        self._materialize_connections()
+        self.route_cache.clear()
+        self.all_pairs = None
+        self._snapshot = None
+        self._metrics.clear()
+        self._lower_bounds = None
+        self._landmarks = {}
+        self._coordinate_ratios = {}
+        self._profile = None
+        self._reverse_trees.clear()
+
+    def snapshot(self):
+        """Return a NetworkSnapshot of the current graph, rebuilt after changes."""
+        if self._snapshot is None:
+            self._snapshot = NetworkSnapshot.from_transport(self)
+        return self._snapshot
+
+    def export_network(self, path, file_format=None):
+        """
+        Stream cities and routes to a CSV or JSON Lines file.
+
+        The format follows the file extension unless file_format ("csv" or
+        "jsonl") is given. Each bidirectional route is written once.
+        """
+        file_format = file_format or _network_format(path)
+        snapshot = self.snapshot()
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            if file_format == 'csv':
+                writer = csv.writer(f)
+                for name in snapshot.names:
+                    writer.writerow(['city', name])
+                for route in snapshot.iter_routes():
+                    writer.writerow(['route', *route])
+            else:
+                for name in snapshot.names:
+                    f.write(json.dumps({'type': 'city', 'name': name}) + '\n')
+                for start, end, comfort, cost, duration in snapshot.iter_routes():
+                    f.write(json.dumps({'type': 'route', 'start': start, 'end': end, 'comfort': comfort,
+                                        'cost': cost, 'duration': duration}) + '\n')
+
+    def import_network(self, path, file_format=None):
+        """
+        Stream cities and routes from a CSV or JSON Lines file written by
+        export_network, one line at a time. Cities named only by a route are
+        created on the fly. Returns the number of routes added.
+        """
+        file_format = file_format or _network_format(path)
+
+        def routes():
+            for record in _read_network_records(path, file_format):
+                if record[0] == 'city':
+                    self.add_city(record[1])
+                else:
+                    yield record[1:]
+
+        return self.add_routes(routes(), add_missing_cities=True)
+
+    def set_coordinates(self, name, latitude, longitude):
+        """Attach (latitude, longitude) to a city for the A* coordinate heuristic."""
+        city = self.get_city(name)
+        if not city:
+            return False
+        city.coordinates = (latitude, longitude)
+        self._coordinate_ratios = {}
+        return True
+
+    def get_city(self, name):
+        """Get a city by name (case-insensitive)."""
+        if self.instrumentation is None:
+            return self.cities.get(name.lower())
+        started = time.perf_counter()
+        city = self.cities.get(name.lower())
+        self.instrumentation.record_lookup(time.perf_counter() - started)
+        return city
+
+    def get_city_by_id(self, city_id):
+        """Get a city by its integer id."""
+        if 0 <= city_id < len(self.city_list):
+            return self.city_list[city_id]
+        return None
+
+    def iter_cities(self):
+        """Iterate over all cities in insertion order."""
+        return iter(self.city_list)
+
+    def __len__(self):
+        return len(self.city_list)
+
+    def show_cities(self):
+        """Display all cities in the system."""
+        if not self.city_list:
+            print("\nNo cities available for booking.")
+            return
             
-            # Add the route
-            transport.add_route(cities[i], cities[j], comfort, base_cost, base_duration)
-    
+        print("\nCities Available For Booking:")
+        for city in self.city_list:
+            print(f"- {city.name}")
+
+    def _traffic_regime(self):
+        """Return the traffic model's (window, weekend, is_rush_hour) state."""
+        return self.traffic_model.regime()
+
+    def _edge_metrics(self, regime, max_regimes=4):
+        """
+        Return the EdgeMetrics of the current snapshot for a traffic regime.
+        Metrics are kept for the last max_regimes regimes, so alternating
+        current-traffic and departure-time queries do not rebuild them.
+        """
+        snapshot = self.snapshot()
+        metrics = self._metrics.get(regime)
+        if metrics is None or metrics.snapshot is not snapshot:
+            # Regimes with the same weekend flag charge the same fares
+            like = next((other for other in reversed(self._metrics.values())
+                         if other.snapshot is snapshot and other.regime[1] == regime[1]), None)
+            metrics = EdgeMetrics(snapshot, regime, self.comfort_levels, self.traffic_model, like)
+            self._metrics[regime] = metrics
+        self._metrics.move_to_end(regime)
+        while len(self._metrics) > max_regimes:
+            self._metrics.popitem(last=False)
+        return metrics
+
+    def _shortest_path_tree(self, start_city, priority="time", stop_at=None, regime=None):
+        """
+        Run Dijkstra from start_city on the snapshot and return the predecessor
+        map; stop_at optionally lists the city ids the caller needs.
+        """
+        if regime is None:
+            regime = self._traffic_regime()
+        metrics = self._edge_metrics(regime)
+        _, pred = dijkstra(metrics.snapshot, metrics.weights(priority), start_city.id, stop_at, self._query_stats)
+        return pred
+
+    def _build_route(self, pred, start_city, end_city, regime):
+        """Rebuild the result dict for end_city by walking the predecessor chain."""
+        if end_city.id != start_city.id and end_city.id not in pred:
+            return None
+
+        metrics = self._edge_metrics(regime)
+        snapshot = metrics.snapshot
+        edges = []
+        current = end_city.id
+        while current != start_city.id:
+            edge = pred[current]
+            edges.append(edge)
+            current = snapshot.sources[edge]
+        edges.reverse()
+        return self._route_from_edges(edges, start_city, metrics)
+
+    def _route_from_edges(self, edges, start_city, metrics, profile=None, departure=None):
+        """
+        Build the RouteResult for a route given as snapshot edge slots.
+        With a TrafficProfile, segment durations and traffic follow the time
+        each segment is entered, leaving at departure (minutes since
+        profile.start), and the result also gets 'departure' and 'arrival'.
+        """
+        snapshot = metrics.snapshot
+        names = snapshot.names
+        targets = snapshot.targets
+        route = (start_city.name,) + tuple([names[targets[edge]] for edge in edges])
+        durations, costs, traffic = metrics.segments(edges)
+        comfort_codes = snapshot.comforts
+        comforts = bytes([comfort_codes[edge] for edge in edges])
+        if profile is not None:
+            durations = array('d')
+            traffic = bytearray()
+            clock = departure
+            for edge in edges:
+                traffic.append(profile.traffic_code(edge, clock))
+                durations.append(profile.duration(edge, clock))
+                clock += durations[-1]
+            traffic = bytes(traffic)
+        if math.inf in durations:
+            return None  # Only reachable over a closed route
+
+        scores = [self.comfort_levels[name]['comfort_score'] for name in snapshot.comfort_names]
+        avg_comfort = sum([scores[code] for code in comforts]) / len(comforts) if comforts else 0
+        if profile is None:
+            return RouteResult(route, durations, costs, traffic, comforts, snapshot.comfort_names, avg_comfort)
+        return RouteResult(route, durations, costs, traffic, comforts, snapshot.comfort_names, avg_comfort,
+                           profile.start + datetime.timedelta(minutes=departure),
+                           profile.start + datetime.timedelta(minutes=clock))
+
+    def _route_tree(self, start_city, priority, regime, stop_at=None):
+        """Return a precomputed shortest-path tree if one is valid, else search."""
+        if self.all_pairs and self.all_pairs['regime'] == regime:
+            trees = self.all_pairs['trees'].get(priority)
+            if trees is not None:
+                return trees[start_city.id]
+        return self._shortest_path_tree(start_city, priority, stop_at, regime)
+
+    def _route_trees(self, start_city, priority, regime, stop_at=None):
+        """
+        Return (pred, time_pred) for a search from start_city.
+
+        time_pred is the time-priority tree needed to price comfort routes
+        (None for cost). Time reuses its own tree. Comfort runs a second
+        Dijkstra search on time weights, bounded by the same stop_at, which
+        pays off when the trees serve several destinations; a single
+        destination uses _time_reference instead.
+        """
+        if priority == "time":
+            pred = self._route_tree(start_city, priority, regime, stop_at)
+            return pred, pred
+        if priority != "comfort":
+            return self._route_tree(start_city, priority, regime, stop_at), None
+        return (self._route_tree(start_city, "comfort", regime, stop_at),
+                self._route_tree(start_city, "time", regime, stop_at))
+
+    def _time_reference(self, start_city, end_city, regime):
+        """
+        Return the unpriced time-priority route that prices a comfort route.
+
+        A second shortest-path tree would cost as much as the comfort search
+        itself, so this is one point-to-point search: A* when ALT landmarks
+        for time exist, bidirectional Dijkstra otherwise. Precomputed
+        all-pairs trees are used when they are valid.
+        """
+        if self.all_pairs and self.all_pairs['regime'] == regime and "time" in self.all_pairs['trees']:
+            return self._build_route(self.all_pairs['trees']["time"][start_city.id], start_city, end_city, regime)
+        algorithm = "astar" if "time" in self._landmarks else "bidirectional"
+        return self._point_to_point(start_city, end_city, "time", regime, algorithm)
+
+    def precompute_all_pairs(self, priorities=("time", "cost", "comfort")):
+        """
+        Precompute a full shortest-path tree from every city (V x Dijkstra).
+
+        Meant for small, dense networks: memory is O(V^2) per priority, after
+        which each query only walks the predecessor chain. The tables are
+        tied to the current traffic regime. Adding cities or routes drops
+        them; update_route and remove_route repair them in place.
+        """
+        regime = self._traffic_regime()
+        metrics = self._edge_metrics(regime)
+        trees = {}
+        dists = {}
+        for priority in priorities:
+            searches = [dijkstra(metrics.snapshot, metrics.weights(priority), city.id) for city in self.city_list]
+            dists[priority] = [dist for dist, _ in searches]
+            trees[priority] = [pred for _, pred in searches]
+        # dists are kept so update_route can repair the trees in place
+        self.all_pairs = {'regime': regime, 'trees': trees, 'dists': dists}
+        self.route_cache.clear()
+
+    def calculate_best_route(self, start, end, priority="time", algorithm="dijkstra", departure=None):
+        """
+        Calculate the best route between two cities.
+        Priority can be "time", "cost", or "comfort".
+        Algorithm can be "dijkstra", "bidirectional", "astar" or "ch"; all
+        return an optimal route, the others usually after far fewer
+        expansions. "ch" queries a contraction hierarchy, see prepare_hierarchy.
+        With a departure datetime, durations follow the traffic at the time
+        each segment is entered instead of the current traffic, see
+        _time_dependent_route. An aware departure is converted to naive
+        local time first.
+        """
+        if self.instrumentation is not None and self._query_stats is None:
+            return self._instrumented_route(start, end, priority, algorithm, departure)
+        return self._best_route(self.get_city(start), self.get_city(end), priority, algorithm, departure)
+
+    def enable_instrumentation(self, trace_limit=1000):
+        """
+        Start counting heap operations, edge relaxations, pruned entries,
+        city lookups and cache hits, and tracing each calculate_best_route
+        query. Returns the Instrumentation that collects them; export with
+        its write_traces (JSON Lines) or prometheus methods. While disabled
+        the only cost is one attribute check per query and city lookup.
+        """
+        if self.instrumentation is None:
+            self.instrumentation = Instrumentation(trace_limit)
+        return self.instrumentation
+
+    def disable_instrumentation(self):
+        """Stop instrumenting; returns the Instrumentation with what it collected."""
+        instrumentation, self.instrumentation = self.instrumentation, None
+        return instrumentation
+
+    def _instrumented_route(self, start, end, priority, algorithm, departure):
+        """calculate_best_route, recording one trace with timings and search counters."""
+        started = time.perf_counter()
+        start_city = self.get_city(start)
+        end_city = self.get_city(end)
+        looked_up = time.perf_counter()
+        hits = self.route_cache.hits
+        misses = self.route_cache.misses
+        stats = self._query_stats = {}
+        try:
+            result = self._best_route(start_city, end_city, priority, algorithm, departure)
+        finally:
+            self._query_stats = None
+        finished = time.perf_counter()
+
+        trace = {
+            'time': time.time(),
+            'start': start,
+            'end': end,
+            'priority': priority,
+            'algorithm': algorithm,
+            'departure': departure.isoformat() if departure is not None else None,
+            'found': result is not None,
+            'query_ms': (finished - started) * 1000,
+            'lookup_ms': (looked_up - started) * 1000,
+            'cache_hits': self.route_cache.hits - hits,
+            'cache_misses': self.route_cache.misses - misses,
+        }
+        for key in ('searches', 'expanded', 'pushes', 'pops', 'decreases', 'relaxed', 'pruned'):
+            trace[key] = stats.get(key, 0)
+        self.instrumentation.record(trace)
+        return result
+
+    def _best_route(self, start_city, end_city, priority, algorithm, departure):
+        """calculate_best_route for City objects (None if a name was not found)."""
+        if not start_city or not end_city:
+            return None
+
+        if departure is not None:
+            return self._time_dependent_route(start_city, end_city, priority, departure)
+
+        regime = self._traffic_regime()
+        cached = self.route_cache.get((start_city.id, end_city.id, priority, regime), _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        if algorithm != "dijkstra":
+            selected_path = self._point_to_point(start_city, end_city, priority, regime, algorithm)
+            return self._finish_route(selected_path, start_city, end_city, priority, regime,
+                                      lambda: self._point_to_point(start_city, end_city, "time", regime, algorithm))
+
+        if priority == "comfort":
+            # One search; the reference is only searched for if it is not cached
+            selected_path = self._build_route(self._route_tree(start_city, priority, regime, (end_city.id,)),
+                                              start_city, end_city, regime)
+            return self._finish_route(selected_path, start_city, end_city, priority, regime,
+                                      lambda: self._time_reference(start_city, end_city, regime))
+
+        pred, time_pred = self._route_trees(start_city, priority, regime, (end_city.id,))
+        return self._finish_tree_route(pred, start_city, end_city, priority, regime, time_pred)
+
+    def _time_dependent_route(self, start_city, end_city, priority, departure):
+        """
+        Route leaving at departure, with time-dependent segment durations.
+
+        Time priority runs an earliest-arrival search on the traffic profile.
+        Cost and comfort routes are chosen with the fares and weights at
+        departure, then timed along the profile. Results are cached per
+        departure time.
+        """
+        departure = _naive_local(departure)
+        cached = self.route_cache.get((start_city.id, end_city.id, priority, departure), _MISSING)
+        if cached is not _MISSING:
+            return cached
+
+        profile = self._traffic_profile(departure)
+        offset = profile.offset(departure)
+        metrics = self._edge_metrics(self.traffic_model.regime(departure))
+
+        def timed_route(pred):
+            if end_city.id != start_city.id and end_city.id not in pred:
+                return None
+            edges = _path_edges(metrics.snapshot, pred, start_city.id, end_city.id)
+            return self._route_from_edges(edges, start_city, metrics, profile, offset)
+
+        def time_route():
+            _, pred = time_dependent_dijkstra(profile, start_city.id, offset, end_city.id, self._query_stats)
+            return timed_route(pred)
+
+        if priority == "time":
+            selected_path = time_route()
+        else:
+            _, pred = dijkstra(metrics.snapshot, metrics.weights(priority), start_city.id, (end_city.id,),
+                               self._query_stats)
+            selected_path = timed_route(pred)
+        return self._finish_route(selected_path, start_city, end_city, priority, departure, time_route)
+
+    def _traffic_profile(self, departure):
+        """Return a TrafficProfile of the current snapshot that covers departure."""
+        snapshot = self.snapshot()
+        profile = self._profile
+        if profile is None or profile.snapshot is not snapshot or not profile.covers(departure):
+            profile = TrafficProfile(snapshot, self.traffic_model, departure)
+            self._profile = profile
+        return profile
+
+    def _finish_tree_route(self, pred, start_city, end_city, priority, regime, time_pred=None):
+        """_finish_route for one destination of a search tree (and its time tree)."""
+        time_route = None
+        if time_pred is not None:
+            time_route = lambda: self._build_route(time_pred, start_city, end_city, regime)
+        selected_path = self._build_route(pred, start_city, end_city, regime)
+        return self._finish_route(selected_path, start_city, end_city, priority, regime, time_route)
+
+    def _finish_route(self, selected_path, start_city, end_city, priority, regime, time_route=None):
+        """
+        Price and cache a route found between two cities. time_route, if
+        given, builds the time-priority reference when it is not cached yet.
+        regime is the traffic regime, or the departure time of a
+        time-dependent route, and keys the cache.
+        """
+        if selected_path and priority == "comfort":
+            # The reference is part of this query, not a lookup of its own
+            time_path = self.route_cache.peek((start_city.id, end_city.id, "time", regime), _MISSING)
+            if time_path is _MISSING and time_route is not None:
+                time_path = self._finish_route(time_route(), start_city, end_city, "time", regime)
+            elif time_path is _MISSING:
+                time_path = self.find_time_priority_path(start_city.name, end_city.name)
+            selected_path = self._apply_comfort_pricing(selected_path, time_path)
+            if time_path:
+                # Kept on the result so book_trip can show it without another search
+                selected_path = selected_path.replace(time_priority_cost=time_path['total_cost'])
+
+        self.route_cache.put((start_city.id, end_city.id, priority, regime), selected_path)
+        return selected_path
+
+    def _point_to_point(self, start_city, end_city, priority, regime, algorithm, stats=None):
+        """Find one route with bidirectional Dijkstra, A* or a CH; returns the unpriced result."""
+        if stats is None:
+            stats = self._query_stats
+        metrics = self._edge_metrics(regime)
+        weights = metrics.weights(priority)
+        if algorithm == "bidirectional":
+            edges = bidirectional_dijkstra(metrics.snapshot, weights, start_city.id, end_city.id, stats)
+        elif algorithm == "astar":
+            heuristic = self._astar_heuristic(priority, end_city.id)
+            edges = astar(metrics.snapshot, weights, start_city.id, end_city.id, heuristic, stats)
+        elif algorithm == "ch":
+            hierarchy = self._hierarchy(priority, metrics)
+            if hierarchy is not None:
+                edges = hierarchy.query(start_city.id, end_city.id, stats)
+            else:
+                # The hierarchy is being repaired; bidirectional search is exact, just slower
+                edges = bidirectional_dijkstra(metrics.snapshot, weights, start_city.id, end_city.id, stats)
+        else:
+            raise ValueError(f"Unknown routing algorithm '{algorithm}'")
+        if edges is None:
+            return None
+        return self._route_from_edges(edges, start_city, metrics)
+
+    def _lower_bound_metrics(self):
+        """EdgeMetrics whose weights never exceed the real ones in any regime."""
+        if self._lower_bounds is None:
+            self._lower_bounds = EdgeMetrics(self.snapshot(), None, self.comfort_levels, self.traffic_model)
+        return self._lower_bounds
+
+    def prepare_landmarks(self, count=8, priorities=("time", "cost", "comfort")):
+        """
+        Precompute ALT landmark tables for A*. Costs two full searches per
+        landmark and priority; tables survive traffic regime changes and are
+        dropped when the graph changes. A* builds them on first use otherwise.
+        """
+        lower_bounds = self._lower_bound_metrics()
+        for priority in priorities:
+            self._landmarks[priority] = LandmarkTable(lower_bounds.snapshot, lower_bounds.weights(priority), count)
+
+    def prepare_hierarchy(self, priorities=("time", "cost")):
+        """
+        Build contraction hierarchies for algorithm="ch" under the current
+        traffic regime (the first "ch" query builds them otherwise).
+
+        Hierarchies are not dropped when the graph changes. The next query
+        starts a repair with ContractionHierarchy.update in the background,
+        see _hierarchy. Only the cities ranked above the lowest one with a
+        cheaper or new route are re-contracted, or every city in the saved
+        order after a route got heavier. Time weights change with the
+        traffic window, which re-contracts in the saved order but skips the
+        ordering pass. Calling this again waits for any such repair.
+        """
+        metrics = self._edge_metrics(self._traffic_regime())
+        for priority in priorities:
+            self._hierarchy(priority, metrics, wait=True)
+
+    def _hierarchy(self, priority, metrics, wait=False):
+        """
+        Return the contraction hierarchy for priority, matching metrics.
+
+        A missing hierarchy is built on the spot. A stale one is repaired as
+        a copy on a background thread, since a re-contraction can take
+        seconds on large networks. Until the copy is ready this returns None
+        and "ch" queries fall back to bidirectional Dijkstra; wait=True
+        blocks instead. The stale hierarchy is never modified while a repair
+        reads it.
+        """
+        weights = metrics.weights(priority)
+        hierarchy = self._hierarchies.get(priority)
+        if hierarchy is None:
+            hierarchy = ContractionHierarchy(metrics.snapshot, weights)
+            self._hierarchies[priority] = hierarchy
+        if hierarchy.weights is weights:
+            return hierarchy
+
+        repair = self._hierarchy_repairs.get(priority)
+        if repair is not None and (wait or repair.done()):
+            del self._hierarchy_repairs[priority]
+            hierarchy = self._hierarchies[priority] = repair.result()
+            if hierarchy.weights is weights:
+                return hierarchy
+            repair = None  # The graph changed again during the repair
+        if wait:
+            hierarchy.update(metrics.snapshot, weights)
+            return hierarchy
+        if repair is None:
+            if self._repair_executor is None:
+                self._repair_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ch-repair')
+            self._hierarchy_repairs[priority] = self._repair_executor.submit(
+                hierarchy.repaired, metrics.snapshot, weights)
+        return None
+
+    def _coordinate_ratio(self, priority):
+        """
+        Smallest lower-bound weight per straight-line km over all routes, or
+        False when some city has no coordinates.
+        """
+        snapshot = self.snapshot()
+        coordinates = [city.coordinates for city in self.city_list[:len(snapshot)]]
+        if not coordinates or not all(coordinates):
+            return False
+
+        weights = self._lower_bound_metrics().weights(priority)
+        ratio = float('inf')
+        for edge in range(snapshot.num_edges):
+            distance = _haversine_km(coordinates[snapshot.sources[edge]], coordinates[snapshot.targets[edge]])
+            if distance > 0:
+                ratio = min(ratio, weights[edge] / distance)
+        return ratio if ratio != float('inf') else 0.0
+
+    def _astar_heuristic(self, priority, target):
+        """
+        Return a consistent lower-bound function for A* towards target.
+
+        Prefers ALT landmarks already built by prepare_landmarks. Otherwise
+        uses straight-line distance when every city has coordinates, scaled
+        by the smallest weight per km over all routes, and builds the
+        landmark tables as a last resort.
+        """
+        if priority in self._landmarks:
+            return self._landmarks[priority].heuristic(target)
+
+        ratio = self._coordinate_ratios.get(priority)
+        if ratio is None:
+            ratio = self._coordinate_ratio(priority)
+            self._coordinate_ratios[priority] = ratio
+        if ratio is not False:
+            cities = self.city_list
+            goal = cities[target].coordinates
+            return lambda city_id: ratio * _haversine_km(cities[city_id].coordinates, goal)
+
+        self.prepare_landmarks(priorities=(priority,))
+        return self._landmarks[priority].heuristic(target)
+
+    def routes_from(self, start, destinations=None, priority="time", regime=None):
+        """
+        Yield (destination, result) for many destinations of one start city.
+
+        All destinations are answered from a single shortest-path tree (plus
+        one time-priority tree for comfort pricing), so N destinations cost
+        one search instead of N. destinations defaults to every city; unknown
+        names yield None, like calculate_best_route. regime defaults to the
+        current traffic regime.
+        """
+        start_city = self.get_city(start)
+        if destinations is None:
+            destinations = [city.name for city in self.city_list]
+        else:
+            destinations = list(destinations)
+        end_cities = [self.get_city(name) for name in destinations]
+
+        if regime is None:
+            regime = self._traffic_regime()
+        stop_at = {city.id for city in end_cities if city}
+        pred = time_pred = None
+
+        for name, end_city in zip(destinations, end_cities):
+            if not start_city or not end_city:
+                yield name, None
+                continue
+
+            cached = self.route_cache.get((start_city.id, end_city.id, priority, regime), _MISSING)
+            if cached is not _MISSING:
+                yield name, cached
+                continue
+
+            # Search lazily, once, the first time a destination is not cached
+            if pred is None:
+                pred, time_pred = self._route_trees(start_city, priority, regime, stop_at)
+            yield name, self._finish_tree_route(pred, start_city, end_city, priority, regime, time_pred)
+
+    def route_matrix(self, starts, destinations, priority="time", workers=None):
+        """
+        Return a len(starts) x len(destinations) list of route results
+        (None where there is no route), running one search per distinct start.
+
+        With workers > 1 the starts are split across a process pool (see
+        _route_matrix_parallel); rows always come back in the order of starts.
+        """
+        destinations = list(destinations)
+        regime = self._traffic_regime()
+        unique_starts = list(dict.fromkeys(start.lower() for start in starts))
+
+        rows = None
+        if workers is not None and workers > 1 and len(unique_starts) > 1:
+            rows = self._route_matrix_parallel(unique_starts, destinations, priority, regime, workers)
+        if rows is None:
+            rows = {
+                start: [result for _, result in self.routes_from(start, destinations, priority, regime)]
+                for start in unique_starts
+            }
+        return [list(rows[start.lower()]) for start in starts]
+
+    def _route_matrix_parallel(self, starts, destinations, priority, regime, workers):
+        """
+        Compute matrix rows for starts on a process pool.
+
+        The graph is written once to a temporary binary snapshot that every
+        worker memory-maps in its initializer, so tasks only carry city names.
+        Returns {start: row}, or None if the pool cannot be used (for example
+        an unpicklable traffic model clock), in which case the caller falls
+        back to serial execution.
+        """
+        try:
+            settings = pickle.dumps((self.comfort_levels, self.traffic_model))
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return None
+
+        fd, path = tempfile.mkstemp(suffix='.busnet')
+        os.close(fd)
+        try:
+            self.save_snapshot(path)
+            chunk_size = max(1, len(starts) // (workers * 4))
+            chunks = [starts[i:i + chunk_size] for i in range(0, len(starts), chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_route_worker,
+                                     initargs=(path, settings)) as pool:
+                results = pool.map(_route_worker_rows, chunks,
+                                   [destinations] * len(chunks),
+                                   [priority] * len(chunks),
+                                   [regime] * len(chunks))
+                rows = {}
+                for chunk, chunk_rows in zip(chunks, results):
+                    rows.update(zip(chunk, chunk_rows))
+            return rows
+        except (OSError, BrokenProcessPool):
+            return None
+        finally:
+            os.remove(path)
+
+    def _apply_comfort_pricing(self, selected_path, time_path):
+        """Return a comfort route priced at exactly 2x the time priority cost."""
+        if selected_path.avg_comfort >= 3.0:
+            if time_path and selected_path.total_cost:
+                time_cost = time_path['total_cost']
+                cost_ratio = (time_cost * 2) / selected_path.total_cost
+                return selected_path.replace(costs=[cost * cost_ratio for cost in selected_path['costs']],
+                                             total_cost=time_cost * 2)
+            return selected_path
+
+        # If the route has a low comfort rating, upgrade it to Premium
+        total_segments = len(selected_path.route) - 1
+        if time_path and total_segments:
+            time_cost = time_path['total_cost']
+            # Distribute the cost proportionally among segments
+            return selected_path.replace(comfort_levels='Premium', avg_comfort=4.0,  # Premium comfort level
+                                         costs=[(time_cost * 2) / total_segments] * total_segments,
+                                         total_cost=time_cost * 2)
+        return selected_path.replace(comfort_levels='Premium', avg_comfort=4.0)
+
+    def pareto_routes(self, start, end, max_labels=16, epsilon=0.0):
+        """
+        Return the Pareto front of routes trading off time, cost and comfort.
+
+        Every route in the list is non-dominated on (total duration, total
+        cost, discomfort), where discomfort sums 5 - comfort_score over the
+        segments; the list is ordered by duration. max_labels and epsilon
+        bound the work per city, see pareto_search. Returns None if either
+        city is unknown, or an empty list if there is no route.
+        """
+        start_city = self.get_city(start)
+        end_city = self.get_city(end)
+
+        if not start_city or not end_city:
+            return None
+
+        metrics = self._edge_metrics(self._traffic_regime())
+        criteria = (metrics.duration, metrics.cost, metrics.discomfort)
+        front = pareto_search(metrics.snapshot, criteria, start_city.id, end_city.id, max_labels, epsilon)
+        routes = [self._route_from_edges(edges, start_city, metrics) for _, edges in front]
+        return [route for route in routes if route is not None]
+
+    def route_options(self, start, end, max_labels=16, epsilon=0.0):
+        """
+        Offer the time, cost and comfort choices as selections from one
+        Pareto front search instead of three separate searches.
+
+        Returns {'front': [...], 'time': ..., 'cost': ..., 'comfort': ...}, or
+        None if there is no route. The comfort choice prefers routes rated 3.0
+        or more, then the highest average comfort, then the shortest duration,
+        and is priced like calculate_best_route's comfort mode.
+        """
+        front = self.pareto_routes(start, end, max_labels, epsilon)
+        if not front:
+            return None
+
+        fastest = min(front, key=lambda x: x['total_duration'])
+        cheapest = min(front, key=lambda x: x['total_cost'])
+        comfort_paths = [p for p in front if p['avg_comfort'] >= 3.0] or front
+        comfort = min(comfort_paths, key=lambda x: (-x['avg_comfort'], x['total_duration']))
+        comfort = self._apply_comfort_pricing(comfort, fastest).replace(time_priority_cost=fastest['total_cost'])
+
+        return {'front': front, 'time': fastest, 'cost': cheapest, 'comfort': comfort}
+
+    def k_best_routes(self, start, end, k=3, priority="time"):
+        """
+        Return up to k distinct loopless routes between two cities, best
+        first by the priority's weight, for offering alternatives (see
+        k_shortest_paths). Each is a RouteResult like calculate_best_route
+        returns, and comfort routes are priced the same way. Returns None if
+        either city is unknown, or an empty list if there is no route.
+        """
+        start_city = self.get_city(start)
+        end_city = self.get_city(end)
+
+        if not start_city or not end_city:
+            return None
+
+        metrics = self._edge_metrics(self._traffic_regime())
+        weights = metrics.weights(priority)
+        tree = self._reverse_tree(metrics.snapshot, weights, start_city.id, end_city.id)
+        paths = k_shortest_paths(metrics.snapshot, weights, start_city.id, end_city.id, k, tree)
+        routes = [self._route_from_edges(edges, start_city, metrics) for _, edges in paths]
+        routes = [route for route in routes if route is not None]
+        if priority == "comfort" and routes:
+            time_path = self.find_time_priority_path(start, end)
+            routes = [self._apply_comfort_pricing(route, time_path) for route in routes]
+            if time_path:
+                routes = [route.replace(time_priority_cost=time_path['total_cost']) for route in routes]
+        return routes
+
+    def _reverse_tree(self, snapshot, weights, source, target, max_trees=8):
+        """
+        Return a (dist, succ, reach) tree towards target that reaches source,
+        for k_shortest_paths. Trees are kept for the last max_trees targets
+        and reused while the weights array is the same object (route updates
+        and regime changes replace it); a tree that does not reach far enough
+        is regrown.
+        """
+        key = (target, id(weights))
+        entry = self._reverse_trees.get(key)
+        if entry is not None and entry[0] is weights and entry[1].get(source, float('inf')) <= entry[3]:
+            self._reverse_trees.move_to_end(key)
+            return entry[1:]
+
+        dist, succ = reverse_dijkstra(snapshot, weights, target, (source,))
+        reach = dist.get(source, float('inf'))
+        self._reverse_trees[key] = (weights, dist, succ, reach)
+        self._reverse_trees.move_to_end(key)
+        while len(self._reverse_trees) > max_trees:
+            self._reverse_trees.popitem(last=False)
+        return dist, succ, reach
+
+    def find_time_priority_path(self, start, end):
+        """Find the time priority path between two cities to use as reference."""
+        return self.calculate_best_route(start, end, "time")
+
+    def trip_error(self, start, destination):
+        """Return the error message for an invalid trip request, or None if it is valid."""
+        start = start.strip()
+        destination = destination.strip()
+
+        if not start or not destination:
+            return "Error: Both departure and destination cities must be provided."
+        if start.lower() == destination.lower():
+            return "Error: Departure and destination cities cannot be the same."
+        if not self.get_city(start):
+            return f"Error: Departure city '{start}' not found in the system."
+        if not self.get_city(destination):
+            return f"Error: Destination city '{destination}' not found in the system."
+        return None
+
+    def booking(self, start, destination, priority="time", algorithm="dijkstra", departure=None):
+        """
+        Validate, route and book a trip; returns the booking as a dict.
+
+        On failure the dict is {'ok': False, 'error': message}. Otherwise it
+        holds 'ok', 'booking_ref', 'start', 'destination', 'priority', the
+        route 'result' from calculate_best_route, 'comfort_rating' and
+        'weather_warning' (None or a condition). book_trip prints it.
+        """
+        error = self.trip_error(start, destination)
+        if error:
+            return {'ok': False, 'error': error}
+        start = start.strip()
+        destination = destination.strip()
+        result = self.calculate_best_route(start, destination, priority, algorithm, departure)
+        return self.confirm_booking(start, destination, priority, result)
+
+    def confirm_booking(self, start, destination, priority, result):
+        """Turn a route result into a booking dict (see booking) without searching."""
+        if not result:
+            return {'ok': False, 'error': f"No route available from {start} to {destination}."}
+
+        # Generate booking reference
+        booking_ref = f"BK{random.randint(10000, 99999)}"
+
+        # Weather warning (simulated)
+        weather = None
+        if random.random() < 0.3:
+            weather_conditions = ["rain", "fog", "high humidity", "high winds"]
+            weather = random.choice(weather_conditions)
+
+        return {
+            'ok': True,
+            'booking_ref': booking_ref,
+            'start': start,
+            'destination': destination,
+            'priority': priority,
+            'result': result,
+            'comfort_rating': round(result['avg_comfort'], 1),
+            'weather_warning': weather,
+        }
+
+    def book_trip(self, start, destination, priority="time", algorithm="dijkstra", departure=None):
+        """
+        Book a trip between two cities with specified priority, optionally
+        leaving at a departure datetime (see calculate_best_route).
+        """
+        booking = self.booking(start, destination, priority, algorithm, departure)
+        if not booking['ok']:
+            print(f"\n{booking['error']}")
+            return False
+
+        result = booking['result']
+        total_cost = round(result['total_cost'], 2)
+        total_time = int(result['total_duration'])
+
+        print("\n===== BOOKING SUCCESSFUL =====")
+        print(f"Booking Reference: {booking['booking_ref']}")
+        print(f"Journey: {booking['start']} → {booking['destination']}")
+        print(f"Optimization Priority: {priority.capitalize()}")
+        if 'departure' in result:
+            print(f"Departure: {result['departure']:%a %H:%M}  Arrival: {result['arrival']:%a %H:%M}")
+
+        # Display complete route with arrows and the segment details
+        print(f"\n{result.format()}")
+
+        print(f"\nTotal Cost: ₹{total_cost}")
+        print(f"Total Travel Time: {total_time} mins ({total_time//60}h {total_time%60}m)")
+        print(f"Comfort Rating: {booking['comfort_rating']}/4")
+
+        # Show relative cost comparison if in comfort mode
+        if priority == "comfort":
+            time_cost = result.get('time_priority_cost')
+            if time_cost is not None:
+                print(f"Cost comparison: Comfort mode is exactly 2.0x the time priority cost")
+                print(f"Time priority would cost: ₹{round(time_cost, 2)}")
+
+        if booking['weather_warning']:
+            print(f"\nWEATHER WARNING: Expect {booking['weather_warning']} along parts of this route.")
+
+        print("=============================")
+        return True
+
+
+# TransportSystem loaded by each process-pool worker, see _route_matrix_parallel
+_worker_transport = None
+
+
+def _init_route_worker(snapshot_path, settings):
+    """Process-pool initializer: memory-map the shared snapshot once per worker."""
+    global _worker_transport
+    comfort_levels, traffic_model = pickle.loads(settings)
+    _worker_transport = TransportSystem.load_snapshot(snapshot_path, traffic_model=traffic_model)
+    _worker_transport.comfort_levels = comfort_levels
+
+
+def _route_worker_rows(starts, destinations, priority, regime):
+    """Compute route matrix rows for a chunk of start cities in a worker."""
+    return [
+        [result for _, result in _worker_transport.routes_from(start, destinations, priority, regime)]
+        for start in starts
+    ]
+
+
+def _network_format(path):
+    """Pick the network file format ("csv" or "jsonl") from a path's extension."""
+    lowered = str(path).lower()
+    if lowered.endswith('.csv'):
+        return 'csv'
+    if lowered.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    raise ValueError(f"Cannot tell the network file format of {path}; use .csv or .jsonl")
+
+
+def _parse_number(text):
+    """Parse a CSV number, keeping whole values as int."""
+    value = float(text)
+    return int(value) if value.is_integer() and '.' not in text else value
+
+
+def _read_network_records(path, file_format):
+    """Yield ('city', name) and ('route', start, end, comfort, cost, duration) records."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            for row in csv.reader(f):
+                if not row:
+                    continue
+                if row[0] == 'city':
+                    yield 'city', row[1]
+                elif row[0] == 'route':
+                    yield 'route', row[1], row[2], row[3], _parse_number(row[4]), _parse_number(row[5])
+        else:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record['type'] == 'city':
+                    yield 'city', record['name']
+                elif record['type'] == 'route':
+                    yield ('route', record['start'], record['end'], record['comfort'],
+                           record['cost'], record['duration'])
+
+
+def simulated_routes(cities, rng=None):
+    """
+    Generate a route between every pair of cities for simulation.
+
+    Distance is derived from the city name lengths; cost and duration scale
+    with it and each route gets a random comfort class.
+    """
+    choice = rng.choice if rng is not None else random.choice
+    comfort_levels = ['Economy', 'Standard', 'Premium', 'Express']
+
+    for i in range(len(cities)):
+        for j in range(i + 1, len(cities)):
+            # Calculate distance based on city names (just for simulation)
+            distance = len(cities[i]) + len(cities[j])
+            yield cities[i], cities[j], choice(comfort_levels), distance * 50, distance * 30
+
+
+def create_fully_connected_network(transport, rng=None):
+    """Create a fully connected network where each city connects to every other city."""
+    cities = [city.name for city in transport.iter_cities()]
+    transport.add_routes(simulated_routes(cities, rng))
     return transport
 
 
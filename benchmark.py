@@ -0,0 +1,539 @@
+import argparse
+import asyncio
+import datetime
+import gc
+import heapq
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from DSA import IndexedMinHeap, MinHeap, TrafficModel, TransportSystem, dijkstra
+from booking_service import BookingService, percentile
+
+
+def time_call(func, *args):
+    """Run func(*args) once and return the elapsed wall time in seconds."""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def heap_workload_minheap(priorities):
+    """Push every priority onto the original MinHeap, then drain it."""
+    heap = MinHeap()
+    for index, priority in enumerate(priorities):
+        heap.push((priority, index))
+    while not heap.is_empty():
+        heap.pop()
+
+
+def heap_workload_heapq(priorities):
+    """Push every priority with heapq, then drain it."""
+    heap = []
+    for index, priority in enumerate(priorities):
+        heapq.heappush(heap, (priority, index))
+    while heap:
+        heapq.heappop(heap)
+
+
+def heap_workload_indexed(priorities):
+    """Push every priority onto IndexedMinHeap, then drain it."""
+    heap = IndexedMinHeap()
+    for index, priority in enumerate(priorities):
+        heap.push(index, priority)
+    while heap:
+        heap.pop()
+
+
+def decrease_workload_heapq(priorities, updates):
+    """Dijkstra-style updates with heapq: push duplicates, skip stale pops."""
+    heap = [(priority, index) for index, priority in enumerate(priorities)]
+    heapq.heapify(heap)
+    best = list(priorities)
+    for index, priority in updates:
+        if priority < best[index]:
+            best[index] = priority
+            heapq.heappush(heap, (priority, index))
+    done = set()
+    while heap:
+        priority, index = heapq.heappop(heap)
+        if index in done:
+            continue
+        done.add(index)
+
+
+def decrease_workload_indexed(priorities, updates):
+    """Dijkstra-style updates with IndexedMinHeap.decrease_key."""
+    heap = IndexedMinHeap(enumerate(priorities))
+    for index, priority in updates:
+        heap.decrease_key(index, priority)
+    while heap:
+        heap.pop()
+
+
+def bench_heaps(sizes=(10**5, 10**6), seed=42):
+    """Compare MinHeap, IndexedMinHeap and heapq on push/pop and decrease-key."""
+    rng = random.Random(seed)
+    print(f"{'workload':<24}{'n':>10}{'seconds':>12}{'ops/sec':>14}")
+    for n in sizes:
+        priorities = [rng.random() for _ in range(n)]
+        updates = [(rng.randrange(n), rng.random() * 0.5) for _ in range(n)]
+
+        runs = [
+            ("push/pop MinHeap", heap_workload_minheap, (priorities,)),
+            ("push/pop IndexedMinHeap", heap_workload_indexed, (priorities,)),
+            ("push/pop heapq", heap_workload_heapq, (priorities,)),
+            ("decrease IndexedMinHeap", decrease_workload_indexed, (priorities, updates)),
+            ("decrease heapq (lazy)", decrease_workload_heapq, (priorities, updates)),
+        ]
+        for label, func, args in runs:
+            elapsed = time_call(func, *args)
+            ops = 2 * n
+            print(f"{label:<24}{n:>10}{elapsed:>12.3f}{ops / elapsed:>14,.0f}")
+
+
+def grid_routes(side, rng, comfort_levels):
+    """Yield route rows linking each cell of a side x side grid to its right and lower neighbours."""
+    for i in range(side * side):
+        neighbours = []
+        if (i + 1) % side:
+            neighbours.append(i + 1)
+        if i + side < side * side:
+            neighbours.append(i + side)
+        for j in neighbours:
+            yield f"G{i}", f"G{j}", rng.choice(comfort_levels), rng.uniform(50, 100), rng.uniform(30, 60)
+
+
+def geometric_routes(count, rng, comfort_levels, degree=6):
+    """
+    Yield route rows of a random geometric graph: count cities scattered
+    over a unit square, linked when closer than the radius that gives about
+    degree neighbours each. Cost and duration grow with distance.
+    """
+    points = [(rng.random(), rng.random()) for _ in range(count)]
+    radius = math.sqrt(degree / (math.pi * count))
+    cells = {}
+    for i, (x, y) in enumerate(points):
+        cells.setdefault((int(x / radius), int(y / radius)), []).append(i)
+    for i, (x, y) in enumerate(points):
+        cx, cy = int(x / radius), int(y / radius)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in cells.get((cx + dx, cy + dy), ()):
+                    if j <= i:
+                        continue
+                    distance = math.hypot(x - points[j][0], y - points[j][1])
+                    if distance < radius:
+                        scale = 1000 * distance + 20
+                        yield (f"R{i}", f"R{j}", rng.choice(comfort_levels),
+                               scale * rng.uniform(1.5, 2.0), scale * rng.uniform(0.8, 1.2))
+
+
+def scale_free_routes(count, rng, comfort_levels, links=2):
+    """
+    Yield route rows of a Barabasi-Albert scale-free graph: each new city
+    links to `links` existing cities picked in proportion to their degree,
+    so a few hubs carry most routes.
+    """
+    ends = []  # Every route end once, so a uniform pick is degree-proportional
+    for i in range(1, count):
+        targets = set()
+        while len(targets) < min(links, i):
+            targets.add(rng.choice(ends) if ends and rng.random() < 0.9 else rng.randrange(i))
+        for j in targets:
+            ends.extend((i, j))
+            yield f"S{i}", f"S{j}", rng.choice(comfort_levels), rng.uniform(50, 300), rng.uniform(30, 180)
+
+
+def complete_routes(count, rng, comfort_levels):
+    """Yield route rows linking every pair of count cities, with random instead of name-length distances."""
+    for i in range(count):
+        for j in range(i + 1, count):
+            distance = rng.uniform(5, 40)
+            yield f"K{i}", f"K{j}", rng.choice(comfort_levels), distance * 50, distance * 30
+
+
+# Suite network generators: name -> (city name prefix, city count for size, route rows)
+NETWORKS = {
+    'grid': ('G', lambda size: math.isqrt(size) ** 2,
+             lambda size, rng, levels: grid_routes(math.isqrt(size), rng, levels)),
+    'geometric': ('R', lambda size: size, geometric_routes),
+    'scale-free': ('S', lambda size: size, scale_free_routes),
+    'complete': ('K', lambda size: size, complete_routes),
+}
+
+
+def synthetic_network(kind, size, seed=42):
+    """
+    Return (city names, route rows) for one of the NETWORKS generators.
+    The same kind, size and seed always give the same network.
+    """
+    prefix, cities, routes = NETWORKS[kind]
+    rng = random.Random(seed)
+    comfort_levels = list(TransportSystem().comfort_levels)
+    names = [f"{prefix}{i}" for i in range(cities(size))]
+    return names, list(routes(size, rng, comfort_levels))
+
+
+def grid_network(side, seed=42):
+    """Build a side x side grid network with coordinates and random route classes."""
+    rng = random.Random(seed)
+    transport = TransportSystem(traffic_model=TrafficModel(seed=seed))
+    comfort_levels = list(transport.comfort_levels)
+    for i in range(side * side):
+        transport.add_city(f"G{i}")
+        transport.set_coordinates(f"G{i}", 10 + (i // side) * 0.05, 70 + (i % side) * 0.05)
+    transport.add_routes(grid_routes(side, rng, comfort_levels))
+    return transport
+
+
+def bench_search(side=150, queries=20, landmarks=8, seed=42):
+    """Compare node expansions and latency of Dijkstra, bidirectional, A* (ALT) and CH."""
+    rng = random.Random(seed)
+    transport = grid_network(side, seed)
+    regime = transport._traffic_regime()
+    metrics = transport._edge_metrics(regime)
+    comfort_levels = list(transport.comfort_levels)
+    print(f"landmark preprocessing: {time_call(transport.prepare_landmarks, landmarks):.2f}s")
+    priorities = ("time", "cost", "comfort")
+    print(f"hierarchy preprocessing: {time_call(transport.prepare_hierarchy, priorities):.2f}s")
+
+    pairs = [(rng.randrange(side * side), rng.randrange(side * side)) for _ in range(queries)]
+    print(f"{'algorithm':<16}{'priority':<10}{'expanded/query':>16}{'ms/query':>12}")
+    for priority in priorities:
+        weights = metrics.weights(priority)
+        for algorithm in ("dijkstra", "bidirectional", "astar", "ch"):
+            expanded = 0
+            start = time.perf_counter()
+            for source, target in pairs:
+                stats = {}
+                if algorithm == "dijkstra":
+                    dijkstra(metrics.snapshot, weights, source, (target,), stats)
+                else:
+                    transport._point_to_point(transport.city_list[source], transport.city_list[target],
+                                              priority, regime, algorithm, stats)
+                expanded += stats['expanded']
+            elapsed = time.perf_counter() - start
+            print(f"{algorithm:<16}{priority:<10}{expanded / queries:>16,.0f}{elapsed * 1000 / queries:>12.2f}")
+
+    # Repair after one new route, as add_route triggers on the next "ch" query
+    transport.add_route("G0", f"G{side * side - 1}", comfort_levels[0], 5000, 3000)
+    metrics = transport._edge_metrics(regime)
+    start = time.perf_counter()
+    recontracted = transport._hierarchies["time"].update(metrics.snapshot, metrics.weights("time"))
+    elapsed = time.perf_counter() - start
+    print(f"hierarchy repair after add_route: {recontracted:,} of {side * side:,} cities in {elapsed:.2f}s")
+
+
+def bench_updates(side=30, updates=50, seed=42):
+    """Time route updates and closures that repair all-pairs trees against a full recompute."""
+    rng = random.Random(seed)
+    transport = grid_network(side, seed)
+    priorities = ("time",)
+    recompute = time_call(transport.precompute_all_pairs, priorities)
+    print(f"all-pairs precomputation ({side * side:,} cities): {recompute:.2f}s")
+
+    routes = [(city.name, connection[0]) for city in transport.city_list for connection in city.connections]
+    start = time.perf_counter()
+    for _ in range(updates):
+        origin, dest = rng.choice(routes)
+        if rng.random() < 0.2:
+            transport.remove_route(origin, dest)
+        else:
+            transport.update_route(origin, dest, duration=rng.uniform(20, 90))
+    elapsed = time.perf_counter() - start
+    print(f"repair per update/closure: {elapsed * 1000 / updates:.1f} ms "
+          f"({recompute / (elapsed / updates):,.0f}x faster than recomputing)")
+
+
+async def _service_load(side, clients, requests, distinct, seed):
+    """Drive a BookingService with concurrent clients; returns (elapsed, latencies, stats)."""
+    rng = random.Random(seed)
+    transport = grid_network(side, seed)
+    service = BookingService(transport)
+    server = await service.serve(port=0)
+    port = server.sockets[0].getsockname()[1]
+
+    # A limited set of popular queries, so caching and coalescing both matter
+    cities = side * side
+    queries = []
+    for _ in range(distinct):
+        start, end = rng.sample(range(cities), 2)
+        queries.append({'type': rng.choice(['route', 'route', 'book']), 'start': f"G{start}", 'end': f"G{end}",
+                        'priority': rng.choice(['time', 'cost', 'comfort'])})
+    latencies = []
+
+    async def client(index):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        client_rng = random.Random(seed + index)
+        for number in range(requests // clients):
+            request = dict(client_rng.choice(queries), id=number)
+            sent = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b'\n')
+            await writer.drain()
+            await reader.readline()
+            latencies.append(time.perf_counter() - sent)
+        writer.close()
+        await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(clients)))
+    elapsed = time.perf_counter() - start
+    server.close()
+    await server.wait_closed()
+    stats = service.stats()
+    service.close()
+    return elapsed, latencies, stats
+
+
+def bench_service(side=30, clients=64, requests=20000, distinct=500, seed=42):
+    """Measure BookingService throughput and client-side latency percentiles."""
+    elapsed, latencies, stats = asyncio.run(_service_load(side, clients, requests, distinct, seed))
+    print(f"{len(latencies):,} requests from {clients} clients in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:,.0f} requests/sec)")
+    print(f"client latency: p50 {percentile(latencies, 0.50) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"server latency: p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms; "
+          f"{stats['coalesced']:,} coalesced, {stats['cache_hits']:,} cache hits, "
+          f"{stats['cache_misses']:,} misses")
+
+
+# Fixed clock for suite networks, so traffic (and node expansions) do not depend on when it runs
+SUITE_CLOCK = datetime.datetime(2024, 1, 10, 12, 0)
+
+# City counts per network for the full suite; --quick divides them by 10
+SUITE_SIZES = {'grid': 2500, 'geometric': 2500, 'scale-free': 2500, 'complete': 150}
+
+# Metrics compared against a baseline, and whether higher values are better
+SUITE_METRICS = {'ops_per_sec': True, 'p50_ms': False, 'p99_ms': False, 'peak_kb': False, 'expanded': False}
+
+# Latencies below this many ms are timer noise and never count as regressions
+SUITE_LATENCY_FLOOR_MS = 0.05
+
+
+def measure(make_ops, repeat=3, memory_ops=None):
+    """
+    Run the zero-argument callables from make_ops() one at a time and
+    summarize them: op count, ops/sec, p50/p90/p99 latency in ms and the
+    peak traced memory in KB. Timings come from the fastest of repeat
+    passes. Memory is traced in a separate pass, over the first memory_ops
+    ops only if given, because tracemalloc slows down every allocation.
+    """
+    times = None
+    for _ in range(repeat):
+        ops = make_ops()
+        gc.collect()
+        run_times = []
+        for op in ops:
+            start = time.perf_counter()
+            op()
+            run_times.append(time.perf_counter() - start)
+        if times is None or sum(run_times) < sum(times):
+            times = run_times
+
+    ops = make_ops()[:memory_ops]
+    gc.collect()
+    tracemalloc.start()
+    for op in ops:
+        op()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    total = sum(times)
+    return {
+        'ops': len(times),
+        'ops_per_sec': len(times) / total if total else 0.0,
+        'p50_ms': percentile(times, 0.50) * 1000,
+        'p90_ms': percentile(times, 0.90) * 1000,
+        'p99_ms': percentile(times, 0.99) * 1000,
+        'peak_kb': peak / 1024,
+    }
+
+
+def suite_network_cases(kind, size, queries, seed):
+    """Benchmark ingestion and route queries on one synthetic network; returns {case: result}."""
+    names, routes = synthetic_network(kind, size, seed)
+    rng = random.Random(seed)
+    results = {}
+
+    def new_transport():
+        return TransportSystem(traffic_model=TrafficModel(seed=seed, clock=lambda: SUITE_CLOCK))
+
+    def city_ops():
+        transport = new_transport()
+        return [lambda name=name: transport.add_city(name) for name in names]
+
+    def route_ops():
+        transport = new_transport()
+        for name in names:
+            transport.add_city(name)
+        return [lambda row=row: transport.add_route(*row) for row in routes]
+
+    results['add_city'] = measure(city_ops)
+    results['add_route'] = measure(route_ops)
+
+    transport = new_transport()
+    for name in names:
+        transport.add_city(name)
+    transport.add_routes(routes)
+    pairs = [rng.sample(names, 2) for _ in range(queries)]
+    transport.calculate_best_route(*pairs[0])  # Build the snapshot and edge metrics outside the timings
+    # Expansions come from the timed queries' own search counters
+    instrumentation = transport.enable_instrumentation(trace_limit=0)
+
+    def query_ops(query, *args):
+        def run(start, end):
+            transport.route_cache.clear()  # Every query searches
+            query(start, end, *args)
+        return lambda: [lambda start=start, end=end: run(start, end) for start, end in pairs]
+
+    def query_case(query, *args):
+        instrumentation.reset()
+        result = measure(query_ops(query, *args), memory_ops=20)
+        result['expanded'] = instrumentation.counters['expanded'] / instrumentation.counters['queries']
+        return result
+
+    for priority in ("time", "cost", "comfort"):
+        results[f'route {priority}'] = query_case(transport.calculate_best_route, priority)
+    results['find_time_priority_path'] = query_case(transport.find_time_priority_path)
+    return results
+
+
+def suite_heap_cases(size, seed):
+    """Benchmark MinHeap push and pop one call at a time; returns {case: result}."""
+    rng = random.Random(seed)
+    priorities = [(rng.random(), index) for index in range(size)]
+
+    def push_ops():
+        heap = MinHeap()
+        return [lambda item=item: heap.push(item) for item in priorities]
+
+    def pop_ops():
+        heap = MinHeap()
+        for item in priorities:
+            heap.push(item)
+        return [heap.pop] * size
+
+    return {'MinHeap push': measure(push_ops), 'MinHeap pop': measure(pop_ops)}
+
+
+def run_suite(quick=False, seed=42, networks=None):
+    """
+    Run the benchmark suite and return its JSON-ready report: environment
+    details plus {"network/case": result} for every case, see measure.
+    """
+    scale = 10 if quick else 1
+    queries = 20 if quick else 200
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'quick': quick,
+        'results': {},
+    }
+    for kind in networks or SUITE_SIZES:
+        size = max(16, SUITE_SIZES[kind] // scale)
+        for case, result in suite_network_cases(kind, size, queries, seed).items():
+            report['results'][f"{kind}/{case}"] = result
+    for case, result in suite_heap_cases(100000 // scale, seed).items():
+        report['results'][f"heap/{case}"] = result
+    return report
+
+
+def print_report(report):
+    """Print a suite report as a table."""
+    print(f"{'case':<36}{'ops':>8}{'ops/sec':>14}{'p50 ms':>10}{'p99 ms':>10}{'peak KB':>12}{'expanded':>10}")
+    for case, result in report['results'].items():
+        expanded = f"{result['expanded']:,.0f}" if 'expanded' in result else '-'
+        print(f"{case:<36}{result['ops']:>8,}{result['ops_per_sec']:>14,.0f}{result['p50_ms']:>10.3f}"
+              f"{result['p99_ms']:>10.3f}{result['peak_kb']:>12,.1f}{expanded:>10}")
+
+
+def compare_reports(baseline, report, tolerance=0.25):
+    """
+    Compare a suite report against a baseline report. A metric regresses
+    when it is worse than the baseline by more than tolerance (a fraction).
+    Prints every change beyond tolerance and returns the regressions as
+    (case, metric, baseline value, new value) tuples.
+    """
+    regressions = []
+    for case, result in report['results'].items():
+        old = baseline['results'].get(case)
+        if old is None:
+            print(f"{case}: new case, no baseline")
+            continue
+        for metric, higher_is_better in SUITE_METRICS.items():
+            if metric not in result or not old.get(metric):
+                continue
+            if metric.endswith('_ms') and result[metric] < SUITE_LATENCY_FLOOR_MS:
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            if abs(change) <= tolerance:
+                continue
+            worse = change < 0 if higher_is_better else change > 0
+            label = "REGRESSION" if worse else "improved"
+            print(f"{case}: {metric} {old[metric]:,.3f} -> {result[metric]:,.3f} ({change:+.0%}) {label}")
+            if worse:
+                regressions.append((case, metric, old[metric], result[metric]))
+    for case in baseline['results']:
+        if case not in report['results']:
+            print(f"{case}: missing from this run")
+    return regressions
+
+
+def suite_main(args):
+    """Command line of the suite benchmark; returns the process exit status."""
+    parser = argparse.ArgumentParser(prog="benchmark.py suite",
+                                     description="Benchmark ingestion, route queries and MinHeap on synthetic networks.")
+    parser.add_argument("--save", metavar="PATH", help="write the results to a JSON baseline file")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a baseline file; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed fraction a metric may worsen before it counts as a regression (default 0.25)")
+    parser.add_argument("--quick", action="store_true", help="run 10x smaller networks and fewer queries")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--network", action="append", choices=list(SUITE_SIZES),
+                        help="only benchmark this network kind (repeatable)")
+    options = parser.parse_args(args)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+    report = run_suite(options.quick, options.seed, options.network)
+    print_report(report)
+    if options.save:
+        with open(options.save, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nSaved results to {options.save}")
+    if baseline is not None:
+        print(f"\nCompared with {options.compare} (tolerance {options.tolerance:.0%}):")
+        regressions = compare_reports(baseline, report, options.tolerance)
+        print(f"{len(regressions)} regression(s)")
+        return 1 if regressions else 0
+    return 0
+
+
+def main():
+    """Run the benchmark named on the command line (default: heap)."""
+    target = sys.argv[1] if len(sys.argv) > 1 else "heap"
+    if target == "heap":
+        bench_heaps()
+    elif target == "search":
+        bench_search()
+    elif target == "updates":
+        bench_updates()
+    elif target == "service":
+        bench_service()
+    elif target == "suite":
+        sys.exit(suite_main(sys.argv[2:]))
+    else:
+        print(f"Unknown benchmark '{target}'. Choose from: heap, search, updates, service, suite")
+
+
+if __name__ == "__main__":
+    main()
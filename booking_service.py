@@ -0,0 +1,237 @@
+import asyncio
+import datetime
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from DSA import RouteResult, TransportSystem, create_fully_connected_network
+
+
+def _json_default(value):
+    """Serialize route results, and their datetimes as ISO 8601 strings."""
+    if isinstance(value, RouteResult):
+        return value.to_dict()
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def percentile(values, fraction):
+    """Return the value at a fraction (0..1) of the sorted values, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class BookingService:
+    """
+    Asyncio front-end that answers route and booking requests for a
+    TransportSystem over a local TCP socket.
+
+    The protocol is JSON Lines: one request object per line, such as
+    {"id": 1, "type": "route", "start": "Chennai", "end": "Delhi"}, with
+    optional "priority", "algorithm" and an ISO "departure". "book" takes
+    the same fields and "stats" none. Each response echoes the request id.
+    Requests on one connection run concurrently, so responses can come
+    back out of order.
+
+    Everything that touches the TransportSystem (validation, searches,
+    bookings and its statistics) runs on a single-thread executor, which
+    keeps the event loop free while a search runs. TransportSystem is not
+    thread-safe, so that one thread owns its caches and counters. Identical
+    route queries that are in flight at the same time share one search.
+    Call close() to shut the executor down.
+    """
+
+    PRIORITIES = ("time", "cost", "comfort")
+    ALGORITHMS = ("dijkstra", "bidirectional", "astar", "ch")
+
+    def __init__(self, transport, executor=None, latency_window=100000):
+        self.transport = transport
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='routing')
+        self.in_flight = {}  # Query key -> future of the search answering it
+        self.latencies = deque(maxlen=latency_window)  # Seconds per request, most recent last
+        self.requests = 0
+        self.coalesced = 0
+
+    def close(self):
+        """Shut down the executor once queued work has finished."""
+        self.executor.shutdown(wait=True)
+
+    def _call(self, function, *args):
+        """Future of function(*args), run on the executor thread that owns the transport."""
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def _search(self, start, end, priority, algorithm, departure):
+        """Validate and answer one route query; runs on the executor thread."""
+        error = self.transport.trip_error(start, end)
+        if error:
+            raise ValueError(error)
+        return self.transport.calculate_best_route(start.strip(), end.strip(), priority, algorithm, departure)
+
+    async def route(self, start, end, priority="time", algorithm="dijkstra", departure=None):
+        """
+        Return calculate_best_route's result, sharing the search with
+        identical queries in flight. Raises ValueError for an invalid trip,
+        see TransportSystem.trip_error.
+        """
+        key = (start.strip().lower(), end.strip().lower(), priority, algorithm, departure)
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shielded, so one cancelled caller does not cancel the others
+            return await asyncio.shield(future)
+
+        future = self._call(self._search, start, end, priority, algorithm, departure)
+        self.in_flight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+
+    async def handle(self, request):
+        """Answer one decoded request with a response dict."""
+        kind = request.get('type')
+        if kind == 'stats':
+            return {'ok': True, 'stats': self.stats(await self._call(self._transport_stats))}
+        if kind not in ('route', 'book'):
+            return {'ok': False, 'error': f"Unknown request type '{kind}'"}
+
+        start = str(request.get('start', ''))
+        end = str(request.get('end', ''))
+        priority = request.get('priority', 'time')
+        algorithm = request.get('algorithm', 'dijkstra')
+        departure = request.get('departure')
+        if priority not in self.PRIORITIES:
+            return {'ok': False, 'error': f"Unknown priority {priority!r}"}
+        if algorithm not in self.ALGORITHMS:
+            return {'ok': False, 'error': f"Unknown routing algorithm {algorithm!r}"}
+        try:
+            if departure is not None:
+                departure = datetime.datetime.fromisoformat(departure)
+        except (TypeError, ValueError):
+            return {'ok': False, 'error': f"Invalid departure time '{departure}'"}
+
+        try:
+            result = await self.route(start, end, priority, algorithm, departure)
+        except ValueError as e:
+            return {'ok': False, 'error': str(e)}
+
+        if kind == 'book':
+            return await self._call(self.transport.confirm_booking, start.strip(), end.strip(), priority, result)
+        if result is None:
+            return {'ok': False, 'error': f"No route available from {start.strip()} to {end.strip()}."}
+        return {'ok': True, 'result': result}
+
+    async def _respond(self, line, writer):
+        """Decode, answer and write back one request line, recording its latency."""
+        started = time.perf_counter()
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            request_id = request.get('id')
+            response = await self.handle(request)
+        except ValueError as e:
+            response = {'ok': False, 'error': f"Bad request: {e}"}
+        except Exception as e:
+            # Any other failure still gets an answer, so the client is not left waiting
+            response = {'ok': False, 'error': f"Internal error: {type(e).__name__}: {e}"}
+        response['id'] = request_id
+        writer.write(json.dumps(response, default=_json_default).encode() + b'\n')
+        self.requests += 1
+        self.latencies.append(time.perf_counter() - started)
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        """Serve one client connection until it closes."""
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self._respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        """Start listening; returns the asyncio server (port 0 picks a free port)."""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def _transport_stats(self):
+        """Cache statistics and instrumentation counters of the transport; runs on the executor thread."""
+        stats = {
+            'cache_hits': self.transport.route_cache.hits,
+            'cache_misses': self.transport.route_cache.misses,
+        }
+        instrumentation = self.transport.instrumentation
+        if instrumentation is not None:
+            stats['instrumentation'] = dict(instrumentation.counters, **instrumentation.timers)
+        return stats
+
+    def stats(self, transport_stats=None):
+        """
+        Request counts, cache statistics and server-side latency percentiles
+        in ms, plus the search counters if the transport is instrumented.
+        transport_stats, from _transport_stats, is read directly if not
+        given, which is only safe while no request is being served.
+        """
+        if transport_stats is None:
+            transport_stats = self._transport_stats()
+        latencies = list(self.latencies)
+        p50 = percentile(latencies, 0.50)
+        p99 = percentile(latencies, 0.99)
+        stats = {
+            'requests': self.requests,
+            'coalesced': self.coalesced,
+            'in_flight': len(self.in_flight),
+            'p50_ms': p50 * 1000 if p50 is not None else None,
+            'p99_ms': p99 * 1000 if p99 is not None else None,
+        }
+        stats.update(transport_stats)
+        return stats
+
+
+async def run_service(transport, host='127.0.0.1', port=8765):
+    """Serve a TransportSystem until the process is interrupted."""
+    service = BookingService(transport)
+    server = await service.serve(host, port)
+    print(f"Booking service listening on {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    """Serve the demo network from DSA.main on the port given on the command line."""
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    transport = TransportSystem()
+    for city in ['Coimbatore', 'Palakkad', 'Chennai', 'Bangalore', 'Mumbai', 'Delhi']:
+        transport.add_city(city)
+    create_fully_connected_network(transport)
+    try:
+        asyncio.run(run_service(transport, port=port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
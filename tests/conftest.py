@@ -0,0 +1,40 @@
+import datetime
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DSA import TrafficModel, TransportSystem  # noqa: E402
+
+CLOCK = datetime.datetime(2025, 3, 4, 12, 0)
+
+
+def make_transport(seed=1):
+    """An empty TransportSystem with seeded traffic and a fixed clock."""
+    return TransportSystem(traffic_model=TrafficModel(seed=seed, clock=lambda: CLOCK))
+
+
+def random_routes(names, density, seed, comfort_levels):
+    """Routes between a random subset of city pairs, as add_routes rows."""
+    rng = random.Random(seed)
+    return [
+        (a, b, rng.choice(comfort_levels), rng.randint(10, 120), rng.randint(5, 240))
+        for i, a in enumerate(names) for b in names[i + 1:]
+        if rng.random() < density
+    ]
+
+
+@pytest.fixture
+def network():
+    """Factory for a seeded random network of n cities."""
+    def build(n=30, density=0.15, seed=1):
+        transport = make_transport(seed)
+        names = [f"City {i}" for i in range(n)]
+        for name in names:
+            transport.add_city(name)
+        transport.add_routes(random_routes(names, density, seed, list(transport.comfort_levels)))
+        return transport
+    return build
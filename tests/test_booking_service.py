@@ -0,0 +1,105 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from booking_service import BookingService
+
+
+@pytest.fixture
+def service(network):
+    service = BookingService(network(n=12, density=0.4, seed=3))
+    yield service
+    service.close()
+
+
+async def exchange(service, requests):
+    """Send requests over one connection to a served BookingService; returns the responses by id."""
+    server = await service.serve(port=0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for request in requests:
+        writer.write((request if isinstance(request, str) else json.dumps(request)).encode() + b'\n')
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in requests]
+    writer.close()
+    await writer.wait_closed()
+    server.close()
+    await server.wait_closed()
+    return {response['id']: response for response in responses}
+
+
+def test_identical_queries_share_one_search(service):
+    route_cache = service.transport.route_cache
+    release = threading.Event()
+
+    async def run():
+        # Hold the executor so every query is in flight before the first search starts
+        blocker = service._call(release.wait)
+        request = {'type': 'route', 'start': 'City 0', 'end': 'City 7', 'priority': 'comfort'}
+        tasks = [asyncio.create_task(service.handle(request)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert len(service.in_flight) == 1
+        release.set()
+        await blocker
+        return await asyncio.gather(*tasks)
+
+    lookups = route_cache.hits + route_cache.misses
+    responses = asyncio.run(run())
+    assert service.coalesced == 4
+    assert route_cache.hits + route_cache.misses == lookups + 1
+    assert not service.in_flight
+    assert all(response == responses[0] for response in responses)
+    assert responses[0]['ok']
+
+
+def test_transport_is_only_used_on_the_executor_thread(service, monkeypatch):
+    threads = set()
+    transport = service.transport
+    for name in ('trip_error', 'calculate_best_route', 'confirm_booking'):
+        method = getattr(transport, name)
+
+        def recorded(*args, method=method, **kwargs):
+            threads.add(threading.current_thread().name)
+            return method(*args, **kwargs)
+        monkeypatch.setattr(transport, name, recorded)
+
+    responses = asyncio.run(exchange(service, [
+        {'id': 1, 'type': 'route', 'start': 'City 0', 'end': 'City 5'},
+        {'id': 2, 'type': 'book', 'start': 'City 1', 'end': 'City 6', 'priority': 'cost'},
+        {'id': 3, 'type': 'route', 'start': 'City 0', 'end': 'Nowhere'},
+    ]))
+    assert responses[2]['ok'] and responses[2]['booking_ref']
+    assert len(threads) == 1 and threads.pop().startswith('routing')
+
+
+def test_error_responses(service, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(service.transport, 'confirm_booking', fail)
+
+    responses = asyncio.run(exchange(service, [
+        '{"id": 1, "type": "route"',
+        '[1, 2]',
+        {'id': 3, 'type': 'cancel'},
+        {'id': 4, 'type': 'route', 'start': 'City 0', 'end': 'City 1', 'priority': 'scenery'},
+        {'id': 5, 'type': 'route', 'start': 'City 0', 'end': 'City 1', 'algorithm': 'bfs'},
+        {'id': 6, 'type': 'route', 'start': 'City 0', 'end': 'City 1', 'departure': 'noon'},
+        {'id': 7, 'type': 'route', 'start': 'City 0', 'end': 'Nowhere'},
+        {'id': 8, 'type': 'route', 'start': 'City 0', 'end': ' city 0 '},
+        {'id': 9, 'type': 'book', 'start': 'City 0', 'end': 'City 1'},
+        {'id': 10, 'type': 'stats'},
+    ]))
+    # Lines that are not a JSON object cannot carry an id
+    assert responses[None]['error'].startswith("Bad request:")
+    assert responses[3]['error'] == "Unknown request type 'cancel'"
+    assert responses[4]['error'] == "Unknown priority 'scenery'"
+    assert responses[5]['error'] == "Unknown routing algorithm 'bfs'"
+    assert responses[6]['error'] == "Invalid departure time 'noon'"
+    assert responses[7]['error'] == "Error: Destination city 'Nowhere' not found in the system."
+    assert responses[8]['error'] == "Error: Departure and destination cities cannot be the same."
+    assert responses[9]['error'] == "Internal error: RuntimeError: boom"
+    for number in range(3, 10):
+        assert responses[number]['ok'] is False
+    assert responses[10]['ok'] and 'cache_misses' in responses[10]['stats']
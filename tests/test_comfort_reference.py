@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+
+def reference_costs(transport, pairs):
+    """time_priority_cost of a fresh comfort query per pair."""
+    costs = []
+    for start, end in pairs:
+        transport.route_cache.clear()
+        result = transport.calculate_best_route(start, end, "comfort")
+        costs.append(result['time_priority_cost'] if result else None)
+    return costs
+
+
+@pytest.mark.parametrize("prepare", [None, "landmarks", "all_pairs"])
+@pytest.mark.parametrize("seed", range(3))
+def test_reference_is_the_time_route(network, seed, prepare):
+    transport = network(n=40, density=0.1, seed=seed)
+    rng = random.Random(seed)
+    names = [city.name for city in transport.city_list]
+    pairs = [rng.sample(names, 2) for _ in range(15)]
+    expected = []
+    for start, end in pairs:
+        result = transport.calculate_best_route(start, end, "time")
+        expected.append(result['total_cost'] if result else None)
+
+    if prepare == "landmarks":
+        transport.prepare_landmarks(priorities=("time",))
+    elif prepare == "all_pairs":
+        transport.precompute_all_pairs(("time", "comfort"))
+    assert reference_costs(transport, pairs) == pytest.approx(expected)
+
+
+def test_reference_comes_from_the_route_cache(network):
+    transport = network(n=40, density=0.1, seed=5)
+    transport.calculate_best_route("City 0", "City 9", "time")
+    stats = {}
+    transport._query_stats = stats
+    try:
+        transport.calculate_best_route("City 0", "City 9", "comfort")
+    finally:
+        transport._query_stats = None
+    assert stats['searches'] == 1
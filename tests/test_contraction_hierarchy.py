@@ -0,0 +1,164 @@
+import datetime
+from concurrent.futures import Future
+
+import pytest
+
+from DSA import TrafficModel
+from conftest import CLOCK, make_transport
+
+PRIORITIES = ("time", "cost", "comfort")
+
+
+def route_weight(transport, result, priority):
+    """Total search weight of a route result under the current regime."""
+    metrics = transport._edge_metrics(transport._traffic_regime())
+    weights = metrics.weights(priority)
+    cities = [transport.get_city(name).id for name in result['route']]
+    return sum(weights[metrics.snapshot.find_edge(a, b)] for a, b in zip(cities, cities[1:]))
+
+
+def assert_ch_matches_dijkstra(transport, pairs):
+    """Every "ch" route weighs the same as the Dijkstra route, or both are missing."""
+    for priority in PRIORITIES:
+        for start, end in pairs:
+            transport.route_cache.clear()
+            expected = transport.calculate_best_route(start, end, priority)
+            transport.route_cache.clear()
+            result = transport.calculate_best_route(start, end, priority, "ch")
+            assert (result is None) == (expected is None)
+            if result is not None:
+                assert route_weight(transport, result, priority) == pytest.approx(
+                    route_weight(transport, expected, priority))
+
+
+class ManualExecutor:
+    """Stands in for the repair thread: submitted repairs run only when run() is called."""
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, function, *args):
+        future = Future()
+        self.pending.append((future, function, args))
+        return future
+
+    def run(self):
+        for future, function, args in self.pending:
+            future.set_result(function(*args))
+        self.pending = []
+
+
+@pytest.fixture
+def prepared(network):
+    """A network with hierarchies built and repairs run synchronously by hand."""
+    transport = network(n=40, density=0.12, seed=11)
+    transport.prepare_hierarchy(PRIORITIES)
+    transport._repair_executor = ManualExecutor()
+    names = [city.name for city in transport.city_list]
+    pairs = [(names[i], names[(i * 7 + 3) % len(names)]) for i in range(len(names))]
+    return transport, pairs
+
+
+def settle(transport):
+    """Finish any background repair and swap it in, as the next query would."""
+    transport._repair_executor.run()
+    transport.prepare_hierarchy(PRIORITIES)
+
+
+def test_matches_dijkstra_when_prepared(prepared):
+    transport, pairs = prepared
+    assert_ch_matches_dijkstra(transport, pairs)
+
+
+def test_after_route_gets_heavier(prepared):
+    transport, pairs = prepared
+    # Make the routes out of the busiest cities much slower and dearer
+    for city in sorted(transport.city_list, key=lambda city: -len(city.connections))[:4]:
+        for dest, *_ in list(city.connections)[:3]:
+            transport.update_route(city.name, dest, cost=900, duration=900)
+    settle(transport)
+    assert_ch_matches_dijkstra(transport, pairs)
+
+
+def test_after_route_is_closed(prepared):
+    transport, pairs = prepared
+    for city in transport.city_list[::5]:
+        if city.connections:
+            transport.remove_route(city.name, city.connections[0][0])
+    settle(transport)
+    assert_ch_matches_dijkstra(transport, pairs)
+
+
+def test_after_route_is_added(prepared):
+    transport, pairs = prepared
+    transport.add_route("City 0", "City 39", "Express", 1, 1)
+    transport.add_city("Newtown")
+    transport.add_route("Newtown", "City 5", "Economy", 10, 10)
+    settle(transport)
+    assert_ch_matches_dijkstra(transport, pairs + [("Newtown", "City 39"), ("City 0", "Newtown")])
+
+
+def test_after_regime_change(network):
+    now = [CLOCK]
+    transport = network(n=40, density=0.12, seed=12)
+    transport.traffic_model = TrafficModel(seed=12, clock=lambda: now[0])
+    transport.prepare_hierarchy(PRIORITIES)
+    transport._repair_executor = ManualExecutor()
+    names = [city.name for city in transport.city_list]
+    pairs = [(names[i], names[-1 - i]) for i in range(len(names) // 2)]
+
+    for hours in (1, 5, 24 * 4 + 2):  # Next window, rush hour, weekend
+        now[0] = CLOCK + datetime.timedelta(hours=hours)
+        settle(transport)
+        assert_ch_matches_dijkstra(transport, pairs)
+
+
+def test_query_during_repair_falls_back(prepared):
+    transport, pairs = prepared
+    start, end = pairs[0]
+    transport.remove_route(start, transport.get_city(start).connections[0][0])
+
+    # The first "ch" query starts the repair and answers without the hierarchy
+    stats = {}
+    transport._query_stats = stats
+    try:
+        result = transport.calculate_best_route(start, end, "time", "ch")
+    finally:
+        transport._query_stats = None
+    assert len(transport._repair_executor.pending) == 1
+    stale = transport._hierarchies["time"]
+    metrics = transport._edge_metrics(transport._traffic_regime())
+    assert stale.weights is not metrics.weights("time")
+    transport.route_cache.clear()
+    expected = transport.calculate_best_route(start, end, "time")
+    assert (result is None) == (expected is None)
+    if result is not None:
+        assert result['total_duration'] == pytest.approx(expected['total_duration'])
+
+    # Further queries while repairs run neither wait nor start another one per priority
+    assert_ch_matches_dijkstra(transport, pairs)
+    assert_ch_matches_dijkstra(transport, pairs)
+    assert set(transport._hierarchy_repairs) == set(PRIORITIES)
+    assert len(transport._repair_executor.pending) == len(PRIORITIES)
+    assert transport._hierarchies["time"] is stale
+
+    # Once it finishes, the next query swaps the repaired copy in
+    transport._repair_executor.run()
+    transport.route_cache.clear()
+    transport.calculate_best_route(start, end, "time", "ch")
+    repaired = transport._hierarchies["time"]
+    assert repaired is not stale and repaired.weights is metrics.weights("time")
+    assert_ch_matches_dijkstra(transport, pairs)
+
+
+def test_repair_thread(network):
+    transport = network(n=40, density=0.12, seed=13)
+    transport.prepare_hierarchy(("time",))
+    city = transport.city_list[0]
+    transport.update_route(city.name, city.connections[0][0], duration=5000)
+    transport.calculate_best_route("City 1", "City 2", "time", "ch")  # Starts the repair thread
+    transport.prepare_hierarchy(("time",))  # Waits for it
+    metrics = transport._edge_metrics(transport._traffic_regime())
+    assert not transport._hierarchy_repairs
+    assert transport._hierarchies["time"].weights is metrics.weights("time")
+    assert_ch_matches_dijkstra(transport, [("City 0", f"City {i}") for i in range(1, 40)])
@@ -0,0 +1,73 @@
+import datetime
+
+import pytest
+
+import DSA
+from DSA import EdgeMetrics, _traffic_code
+from conftest import CLOCK
+
+# Tuesday noon and the next two hours, then Saturday noon
+WEEKDAY = [CLOCK + datetime.timedelta(hours=hours) for hours in range(3)]
+SATURDAY = CLOCK + datetime.timedelta(days=4)
+
+
+def build(transport, regime, like=None):
+    return EdgeMetrics(transport.snapshot(), regime, transport.comfort_levels, transport.traffic_model, like)
+
+
+def test_arrays_are_built_on_first_use(network):
+    transport = network(n=30, density=0.2, seed=2)
+    metrics = build(transport, transport.traffic_model.regime(CLOCK))
+    metrics.weights("cost")
+    assert metrics._traffic is None and metrics._duration is None and metrics._comfort is None
+    metrics.weights("comfort")
+    assert metrics._traffic is not None and metrics._duration is not None
+
+
+def test_segments_match_the_arrays(network):
+    transport = network(n=30, density=0.2, seed=3)
+    regime = transport.traffic_model.regime(CLOCK)
+    edges = list(range(0, transport.snapshot().num_edges, 3))
+    lazy = build(transport, regime).segments(edges)
+    metrics = build(transport, regime)
+    assert lazy == (
+        DSA.array('d', [metrics.duration[edge] for edge in edges]),
+        DSA.array('d', [metrics.cost[edge] for edge in edges]),
+        bytes([metrics.traffic[edge] for edge in edges]),
+    )
+    hashes = metrics.snapshot.city_hashes
+    salt = transport.traffic_model._salt(regime[0])
+    assert all(metrics.traffic[edge] == _traffic_code(hashes[metrics.snapshot.sources[edge]],
+                                                      hashes[metrics.snapshot.targets[edge]], salt)
+               for edge in range(metrics.snapshot.num_edges))
+
+
+def test_cost_is_shared_between_regimes_with_the_same_fares(network):
+    transport = network(n=30, density=0.2, seed=4)
+    metrics = [transport._edge_metrics(transport.traffic_model.regime(moment)) for moment in WEEKDAY]
+    weekend = transport._edge_metrics(transport.traffic_model.regime(SATURDAY))
+    assert metrics[0].cost is metrics[1].cost is metrics[2].cost
+    assert weekend.cost is not metrics[0].cost
+    assert metrics[0].duration is not metrics[1].duration
+
+    # An update patches the shared array once and keeps it shared
+    city = transport.city_list[0]
+    destination = city.connections[0][0]
+    assert transport.update_route(city.name, destination, cost=1)
+    assert metrics[0].cost is metrics[1].cost is metrics[2].cost
+    for regime_metrics in metrics + [weekend]:
+        fresh = build(transport, regime_metrics.regime)
+        for priority in ("time", "cost", "comfort"):
+            assert regime_metrics.weights(priority) == fresh.weights(priority)
+
+
+@pytest.mark.skipif(DSA.np is None, reason="NumPy is not installed")
+@pytest.mark.parametrize("moment", [CLOCK, SATURDAY, None])
+def test_numpy_matches_pure_python(network, monkeypatch, moment):
+    transport = network(n=40, density=0.2, seed=5)
+    regime = None if moment is None else transport.traffic_model.regime(moment)
+    vectorized = build(transport, regime)
+    arrays = [vectorized.traffic] + [vectorized.weights(priority) for priority in ("time", "cost", "comfort")]
+    monkeypatch.setattr(DSA, 'np', None)
+    plain = build(transport, regime)
+    assert arrays == [plain.traffic] + [plain.weights(priority) for priority in ("time", "cost", "comfort")]
@@ -0,0 +1,112 @@
+import heapq
+import random
+
+import pytest
+
+from DSA import IndexedMinHeap
+
+
+def check_invariant(queue):
+    """Assert the heap property and that position indexes every entry."""
+    heap = queue.heap
+    for index in range(1, len(heap)):
+        assert not heap[index] < heap[(index - 1) >> 1]
+    assert len(queue.position) == len(heap)
+    for item_id, index in queue.position.items():
+        assert heap[index][2] == item_id
+
+
+class LazyHeap:
+    """Reference queue on heapq: decrease_key pushes a duplicate, pop skips stale entries."""
+
+    def __init__(self):
+        self.heap = []
+        self.current = {}  # item_id -> (priority, sequence) of its live entry
+        self.counter = 0
+
+    def push(self, item_id, priority):
+        if item_id in self.current:
+            return False
+        self.current[item_id] = (priority, self.counter)
+        heapq.heappush(self.heap, (priority, self.counter, item_id))
+        self.counter += 1
+        return True
+
+    def decrease_key(self, item_id, priority):
+        if item_id not in self.current or priority >= self.current[item_id][0]:
+            return False
+        sequence = self.current[item_id][1]  # Ties keep the original insertion order
+        self.current[item_id] = (priority, sequence)
+        heapq.heappush(self.heap, (priority, sequence, item_id))
+        return True
+
+    def pop(self):
+        while self.heap:
+            priority, sequence, item_id = heapq.heappop(self.heap)
+            if self.current.get(item_id) == (priority, sequence):
+                del self.current[item_id]
+                return item_id, priority
+        return None
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_heapq_with_decrease_key(seed):
+    rng = random.Random(seed)
+    queue = IndexedMinHeap()
+    reference = LazyHeap()
+    next_id = 0
+    for _ in range(2000):
+        action = rng.random()
+        if action < 0.4:
+            # Small integer priorities give plenty of ties
+            priority = rng.randint(0, 50)
+            assert queue.push(next_id, priority) == reference.push(next_id, priority)
+            next_id += 1
+        elif action < 0.75 and reference.current:
+            # Repeatedly lower the same few items, leaving stale entries in the reference
+            item_id = rng.choice(sorted(reference.current)[:5])
+            priority = reference.current[item_id][0] - rng.randint(-2, 10)
+            assert queue.decrease_key(item_id, priority) == reference.decrease_key(item_id, priority)
+        else:
+            assert queue.pop() == reference.pop()
+        check_invariant(queue)
+        assert len(queue) == len(reference.current)
+
+    while reference.current:
+        assert queue.pop() == reference.pop()
+    assert queue.pop() is None and queue.is_empty()
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_heapify(seed):
+    rng = random.Random(seed)
+    items = [(rng.randrange(300), rng.randint(0, 100)) for _ in range(500)]
+    queue = IndexedMinHeap(items)
+    check_invariant(queue)
+
+    # Duplicate ids keep their first priority, and ties pop in input order
+    first = {}
+    for order, (item_id, priority) in enumerate(items):
+        first.setdefault(item_id, (priority, order))
+    expected = sorted(first, key=first.get)
+    for item_id in expected[:50:3]:
+        queue.decrease_key(item_id, -1)
+        check_invariant(queue)
+    lowered = sorted(expected[:50:3], key=lambda item_id: first[item_id][1])
+    expected = lowered + [item_id for item_id in expected if item_id not in lowered]
+
+    popped = [queue.pop() for _ in range(len(queue))]
+    assert [item_id for item_id, _ in popped] == expected
+    assert queue.heapify([]) is None and len(queue) == 0
+
+
+def test_decrease_key_rejects():
+    queue = IndexedMinHeap([("a", 5), ("b", 7)])
+    assert queue.decrease_key("a", 5) is False
+    assert queue.decrease_key("a", 6) is False
+    assert queue.decrease_key("missing", 1) is False
+    assert queue.push("a", 1) is False
+    assert queue.decrease_key("b", 1) is True
+    assert queue.decreases == 1 and queue.pushes == 2
+    assert queue.peek() == ("b", 1)
+    assert "a" in queue and queue.pop() == ("b", 1) and "b" not in queue
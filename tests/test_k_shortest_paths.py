@@ -0,0 +1,130 @@
+import random
+
+import pytest
+
+from DSA import k_shortest_paths, reverse_dijkstra
+from conftest import make_transport, random_routes
+
+INFINITY = float('inf')
+COMFORT_LEVELS = ['Economy', 'Standard', 'Premium', 'Express']
+
+
+def all_simple_paths(snapshot, weights, source, target):
+    """Every loopless finite route from source to target as (weight, edges), lightest first."""
+    paths = []
+
+    def walk(city_id, visited, edges, weight):
+        if city_id == target:
+            paths.append((weight, list(edges)))
+            return
+        for edge in snapshot.edges(city_id):
+            dest = snapshot.targets[edge]
+            if dest in visited or weights[edge] == INFINITY:
+                continue
+            visited.add(dest)
+            edges.append(edge)
+            walk(dest, visited, edges, weight + weights[edge])
+            edges.pop()
+            visited.discard(dest)
+
+    walk(source, {source}, [], 0)
+    paths.sort(key=lambda path: path[0])
+    return paths
+
+
+def small_network(seed):
+    """A seeded network small enough to enumerate, with one updated and one closed route."""
+    rng = random.Random(seed)
+    transport = make_transport(seed)
+    names = [f"C{i}" for i in range(rng.randint(4, 8))]
+    for name in names:
+        transport.add_city(name)
+    routes = random_routes(names, 0.5, seed, COMFORT_LEVELS)
+    transport.add_routes(routes)
+    if len(routes) > 2:
+        start, end = rng.choice(routes)[:2]
+        transport.update_route(start, end, duration=rng.randint(5, 300))
+        start, end = rng.choice(routes)[:2]
+        transport.remove_route(start, end)
+    return transport, rng
+
+
+def check_paths(snapshot, weights, source, target, paths):
+    """Assert every path is a loopless route from source to target with the stated weight."""
+    assert len({tuple(edges) for _, edges in paths}) == len(paths)
+    for weight, edges in paths:
+        cities = [source] + [snapshot.targets[edge] for edge in edges]
+        assert all(snapshot.sources[edge] == city_id for edge, city_id in zip(edges, cities))
+        assert cities[-1] == target
+        assert len(set(cities)) == len(cities)
+        assert sum(weights[edge] for edge in edges) == pytest.approx(weight)
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_matches_brute_force(seed):
+    transport, rng = small_network(seed)
+    metrics = transport._edge_metrics(transport._traffic_regime())
+    snapshot = metrics.snapshot
+
+    for priority in ("time", "cost", "comfort"):
+        weights = metrics.weights(priority)
+        source, target = rng.sample(range(len(snapshot)), 2)
+        k = rng.randint(1, 12)
+        paths = k_shortest_paths(snapshot, weights, source, target, k)
+        expected = all_simple_paths(snapshot, weights, source, target)[:k]
+
+        assert [weight for weight, _ in paths] == pytest.approx([weight for weight, _ in expected])
+        check_paths(snapshot, weights, source, target, paths)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_shared_tree_gives_same_weights(seed):
+    transport, rng = small_network(seed)
+    metrics = transport._edge_metrics(transport._traffic_regime())
+    snapshot = metrics.snapshot
+    weights = metrics.weights("time")
+    target = rng.randrange(len(snapshot))
+    dist, succ = reverse_dijkstra(snapshot, weights, target)
+    tree = (dist, succ, INFINITY)
+
+    for source in range(len(snapshot)):
+        if source == target:
+            continue
+        with_tree = k_shortest_paths(snapshot, weights, source, target, 6, tree)
+        without = k_shortest_paths(snapshot, weights, source, target, 6)
+        assert [weight for weight, _ in with_tree] == pytest.approx([weight for weight, _ in without])
+        check_paths(snapshot, weights, source, target, with_tree)
+
+
+def test_edge_cases():
+    transport, _ = small_network(3)
+    metrics = transport._edge_metrics(transport._traffic_regime())
+    snapshot = metrics.snapshot
+    weights = metrics.weights("time")
+    assert k_shortest_paths(snapshot, weights, 0, 1, 0) == []
+    assert k_shortest_paths(snapshot, weights, 2, 2, 5) == [(0, [])]
+
+    transport.add_city("Island")
+    metrics = transport._edge_metrics(transport._traffic_regime())
+    island = transport.get_city("Island").id
+    assert k_shortest_paths(metrics.snapshot, metrics.weights("time"), 0, island, 3) == []
+
+
+@pytest.mark.parametrize("priority", ["time", "cost", "comfort"])
+def test_k_best_routes(network, priority):
+    transport = network(n=25, density=0.2, seed=5)
+    routes = transport.k_best_routes("City 0", "City 9", k=5, priority=priority)
+    assert 1 < len(routes) <= 5
+    assert len({tuple(route['route']) for route in routes}) == len(routes)
+    assert all(route['route'][0] == "City 0" and route['route'][-1] == "City 9" for route in routes)
+
+    best = transport.calculate_best_route("City 0", "City 9", priority)
+    if priority == "time":
+        assert routes[0]['total_duration'] == pytest.approx(best['total_duration'])
+        assert [route['total_duration'] for route in routes] == sorted(route['total_duration'] for route in routes)
+    elif priority == "cost":
+        assert routes[0]['total_cost'] == pytest.approx(best['total_cost'])
+    else:
+        assert all(route['time_priority_cost'] == best['time_priority_cost'] for route in routes)
+
+    assert transport.k_best_routes("City 0", "Nowhere") is None
@@ -0,0 +1,72 @@
+import itertools
+
+import pytest
+
+from conftest import make_transport
+
+PRIORITIES = ("time", "cost", "comfort")
+
+
+def route_dicts(transport, names):
+    """to_dict() of every route between names for every priority (None where there is none)."""
+    results = {}
+    for start, end in itertools.permutations(names, 2):
+        for priority in PRIORITIES:
+            result = transport.calculate_best_route(start, end, priority)
+            results[start, end, priority] = None if result is None else result.to_dict()
+    return results
+
+
+@pytest.fixture
+def source(network):
+    transport = network(n=25, seed=8)
+    # Names that need quoting or escaping in CSV and JSON
+    transport.add_city('São "Paulo", SP')
+    transport.add_route('São "Paulo", SP', "City 3", "Premium", 40, 55)
+    # An updated and a closed route (add_route keeps a route that already exists)
+    transport.add_route("City 3", "City 4", "Economy", 30, 60)
+    transport.update_route("City 3", "City 4", cost=12, duration=300)
+    transport.add_route("City 0", "City 1", "Standard", 20, 40)
+    transport.remove_route("City 0", "City 1")
+    return transport
+
+
+@pytest.mark.parametrize("file_format", ["csv", "jsonl"])
+def test_export_import_round_trip(source, tmp_path, file_format):
+    path = tmp_path / f"network.{file_format}"
+    source.export_network(str(path))
+
+    loaded = make_transport(8)
+    loaded.import_network(str(path))
+
+    names = [city.name for city in source.city_list]
+    assert [city.name for city in loaded.city_list] == names
+    assert route_dicts(loaded, names) == route_dicts(source, names)
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_snapshot_round_trip(source, tmp_path, use_mmap):
+    path = tmp_path / "network.busnet"
+    source.save_snapshot(str(path))
+
+    loaded = type(source).load_snapshot(str(path), use_mmap, traffic_model=source.traffic_model)
+
+    names = [city.name for city in source.city_list]
+    assert [city.name for city in loaded.city_list] == names
+    assert route_dicts(loaded, names) == route_dicts(source, names)
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_loaded_snapshot_accepts_changes(source, tmp_path, use_mmap):
+    path = tmp_path / "network.busnet"
+    source.save_snapshot(str(path))
+    loaded = type(source).load_snapshot(str(path), use_mmap, traffic_model=source.traffic_model)
+
+    for transport in (source, loaded):
+        transport.add_route("City 2", "City 5", "Express", 30, 90)
+        transport.update_route("City 2", "City 5", duration=1)
+        transport.add_route("City 6", "City 7", "Economy", 15, 25)
+        transport.remove_route("City 6", "City 7")
+
+    names = [city.name for city in source.city_list]
+    assert route_dicts(loaded, names) == route_dicts(source, names)
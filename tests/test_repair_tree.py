@@ -0,0 +1,128 @@
+import random
+from array import array
+
+import pytest
+
+from DSA import dijkstra, repair_tree
+from conftest import make_transport
+
+INFINITY = float('inf')
+
+
+def check_tree(snapshot, weights, source, dist, pred):
+    """Assert that (dist, pred) is a shortest-path tree equal to a fresh build."""
+    fresh_dist, _ = dijkstra(snapshot, weights, source)
+    assert dist.keys() == fresh_dist.keys()
+    for city_id, distance in fresh_dist.items():
+        assert dist[city_id] == pytest.approx(distance)
+    assert source not in pred
+    for city_id, edge in pred.items():
+        # Ties may pick a different edge, but it must be a tight tree edge
+        assert snapshot.targets[edge] == city_id
+        assert dist[snapshot.sources[edge]] + weights[edge] == pytest.approx(dist[city_id])
+
+
+def changed_weights(snapshot, weights, rng, count):
+    """Copy weights with count random routes (both directions) made heavier, lighter or closed."""
+    weights = array('d', weights)
+    changed = []
+    for edge in rng.sample(range(snapshot.num_edges), count):
+        reverse = snapshot.find_edge(snapshot.targets[edge], snapshot.sources[edge])
+        kind = rng.choice(("heavier", "lighter", "closed"))
+        if kind == "closed":
+            weight = INFINITY
+        elif kind == "heavier":
+            weight = weights[edge] * rng.uniform(1.5, 10)
+        else:
+            weight = weights[edge] * rng.uniform(0.05, 0.9)
+        for slot in (edge, reverse):
+            weights[slot] = weight
+            changed.append(slot)
+    return weights, changed
+
+
+@pytest.mark.parametrize("seed", range(12))
+@pytest.mark.parametrize("priority", ["time", "cost", "comfort"])
+def test_repair_matches_fresh_build(network, seed, priority):
+    transport = network(n=40, density=0.1, seed=seed)
+    metrics = transport._edge_metrics(transport._traffic_regime())
+    snapshot = metrics.snapshot
+    weights = metrics.weights(priority)
+    rng = random.Random(seed)
+
+    for source in rng.sample(range(len(snapshot)), 5):
+        dist, pred = dijkstra(snapshot, weights, source)
+        current = weights
+        for _ in range(4):
+            current, changed = changed_weights(snapshot, current, rng, rng.randint(1, 4))
+            repair_tree(snapshot, current, dist, pred, changed)
+            check_tree(snapshot, current, source, dist, pred)
+
+
+def test_repair_reconnects_and_disconnects():
+    # A path A-B-C plus a long way round A-C; close and reopen B-C
+    transport = make_transport()
+    for name in "ABCD":
+        transport.add_city(name)
+    transport.add_routes([("A", "B", "Economy", 10, 10), ("B", "C", "Economy", 10, 10),
+                          ("A", "C", "Economy", 50, 50), ("C", "D", "Economy", 5, 5)])
+    metrics = transport._edge_metrics(transport._traffic_regime())
+    snapshot = metrics.snapshot
+    weights = array('d', metrics.weights("cost"))
+    dist, pred = dijkstra(snapshot, weights, 0)
+
+    bridge = [snapshot.find_edge(1, 2), snapshot.find_edge(2, 1)]
+    original = [weights[edge] for edge in bridge]
+    for edge in bridge:
+        weights[edge] = INFINITY
+    repair_tree(snapshot, weights, dist, pred, bridge)
+    check_tree(snapshot, weights, 0, dist, pred)
+
+    # Closing A-C as well leaves C and D unreachable
+    detour = [snapshot.find_edge(0, 2), snapshot.find_edge(2, 0)]
+    for edge in detour:
+        weights[edge] = INFINITY
+    repair_tree(snapshot, weights, dist, pred, detour)
+    check_tree(snapshot, weights, 0, dist, pred)
+    assert dist[2] == dist[3] == INFINITY
+
+    for edge, weight in zip(bridge, original):
+        weights[edge] = weight
+    repair_tree(snapshot, weights, dist, pred, bridge)
+    check_tree(snapshot, weights, 0, dist, pred)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_update_route_repairs_all_pairs(network, seed):
+    transport = network(n=30, density=0.12, seed=seed)
+    transport.precompute_all_pairs(("time", "cost"))
+    rng = random.Random(seed)
+    routes = [(city.name, dest) for city in transport.city_list for dest, *_ in city.connections]
+
+    for _ in range(6):
+        start, end = rng.choice(routes)
+        if rng.random() < 0.3:
+            transport.remove_route(start, end)
+        else:
+            transport.update_route(start, end, cost=rng.randint(1, 200), duration=rng.randint(1, 400))
+
+    metrics = transport._edge_metrics(transport.all_pairs['regime'])
+    for priority in ("time", "cost"):
+        weights = metrics.weights(priority)
+        for source, (dist, pred) in enumerate(zip(transport.all_pairs['dists'][priority],
+                                                  transport.all_pairs['trees'][priority])):
+            check_tree(metrics.snapshot, weights, source, dist, pred)
+
+
+def test_update_route_rejects_unknown_comfort(network):
+    transport = network(n=20, density=0.2, seed=3)
+    start = transport.city_list[0]
+    end_name = start.connections[0][0]
+    before = {city.name: list(city.connections) for city in transport.city_list}
+    routes = [transport.calculate_best_route("City 0", f"City {i}", "cost") for i in range(1, 20)]
+
+    assert transport.update_route(start.name, end_name, comfort="Luxury", cost=1) is False
+
+    assert {city.name: list(city.connections) for city in transport.city_list} == before
+    transport.route_cache.clear()
+    assert [transport.calculate_best_route("City 0", f"City {i}", "cost") for i in range(1, 20)] == routes
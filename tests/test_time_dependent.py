@@ -0,0 +1,96 @@
+import datetime
+import random
+
+import pytest
+
+from conftest import CLOCK, make_transport
+
+
+def window_start(transport, moment):
+    """Start of the traffic window containing moment."""
+    window = transport.traffic_model.regime(moment)[0]
+    return datetime.datetime.fromtimestamp(window * transport.traffic_model.window_minutes * 60)
+
+
+def window_durations(transport, moment):
+    """Static per-edge durations of the traffic window containing moment."""
+    return transport._edge_metrics(transport.traffic_model.regime(moment)).duration
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_profile_is_fifo(network, seed):
+    transport = network(n=30, density=0.15, seed=seed)
+    profile = transport._traffic_profile(CLOCK)
+    for edge in range(profile.snapshot.num_edges):
+        arrival = float('-inf')
+        for minute in range(0, 20 * profile.window_minutes, 7):
+            later = minute + profile.duration(edge, minute)
+            assert later >= arrival - 1e-4  # Breakpoints are float32
+            arrival = later
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_later_departure_never_arrives_earlier(network, seed):
+    transport = network(n=30, density=0.15, seed=seed)
+    rng = random.Random(seed)
+    names = [city.name for city in transport.city_list]
+    for start, end in [rng.sample(names, 2) for _ in range(5)]:
+        arrival = None
+        for minutes in range(0, 8 * 60, 13):
+            result = transport.calculate_best_route(
+                start, end, "time", departure=CLOCK + datetime.timedelta(minutes=minutes))
+            if result is None:
+                break
+            if arrival is not None:
+                assert result['arrival'] >= arrival - datetime.timedelta(microseconds=1)
+            arrival = result['arrival']
+
+
+def test_segment_after_window_boundary_uses_next_window():
+    # With seed 6, B-C has a different traffic level in each of the three windows
+    transport = make_transport(6)
+    for name in ("A", "B", "C"):
+        transport.add_city(name)
+    transport.add_routes([("A", "B", "Economy", 10, 20), ("B", "C", "Economy", 10, 25)])
+    snapshot = transport.snapshot()
+    first = snapshot.find_edge(0, 1)
+    second = snapshot.find_edge(1, 2)
+
+    window = datetime.timedelta(minutes=transport.traffic_model.window_minutes)
+    boundary = window_start(transport, CLOCK) + window
+    departure = boundary - datetime.timedelta(minutes=5)
+    current = window_durations(transport, departure)
+    following = window_durations(transport, boundary)
+    after = window_durations(transport, boundary + window)
+
+    assert len({current[second], following[second], after[second]}) == 3
+
+    def interpolate(before, later, minutes):
+        return before + (later - before) * minutes / window.total_seconds() * 60
+
+    # A-B is entered 5 minutes before the boundary, B-C after it
+    expected_first = interpolate(current[first], following[first], 55)
+    reached = departure + datetime.timedelta(minutes=expected_first)
+    assert reached > boundary
+    expected_second = interpolate(following[second], after[second],
+                                  (reached - boundary).total_seconds() / 60)
+
+    result = transport.calculate_best_route("A", "C", "time", departure=departure)
+    assert result['route'] == ("A", "B", "C")
+    assert list(result['durations']) == pytest.approx([expected_first, expected_second], rel=1e-6)
+    assert result['departure'] == departure
+    assert (result['arrival'] - departure).total_seconds() / 60 == pytest.approx(
+        expected_first + expected_second, rel=1e-6)
+
+
+def test_departure_at_boundary_uses_next_window(network):
+    transport = network(n=20, density=0.2, seed=7)
+    profile = transport._traffic_profile(CLOCK)
+    for index in range(1, 6):
+        moment = profile.start + datetime.timedelta(minutes=index * profile.window_minutes)
+        durations = window_durations(transport, moment)
+        following = window_durations(transport, moment + datetime.timedelta(minutes=profile.window_minutes))
+        for edge in range(profile.snapshot.num_edges):
+            if durations[edge] > following[edge] + profile.window_minutes:
+                continue  # Capped to keep the profile FIFO
+            assert profile.duration(edge, index * profile.window_minutes) == pytest.approx(durations[edge], rel=1e-6)